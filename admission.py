@@ -0,0 +1,186 @@
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from cancellation import check_cancelled
+
+# Lower runs first
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BACKGROUND: "background"}
+# Job kind -> priority of the model calls it makes
+KIND_PRIORITIES = {"detection": INTERACTIVE, "analysis": NORMAL, "speculative": BACKGROUND}
+
+# Process-wide model call budget, 0 requests per minute means no rate limit
+REQUESTS_PER_MINUTE = float(os.getenv("MODEL_REQUESTS_PER_MINUTE", "60"))
+BURST = float(os.getenv("MODEL_BURST", "10"))
+MAX_CONCURRENT = int(os.getenv("MODEL_MAX_CONCURRENT", "8"))
+# Used for wait estimates until real call latencies have been seen
+DEFAULT_LATENCY_S = 3.0
+EWMA_ALPHA = 0.3
+# Waiters wake up at least this often to notice cancellation
+POLL_SECONDS = 0.5
+
+
+class AdmissionController:
+    """Token-bucket rate limit plus bounded concurrency, granted in priority order"""
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, burst=BURST, max_concurrent=MAX_CONCURRENT):
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._latency = None
+        self._admitted = {}
+        self._wait_seconds = {}
+        self.configure(requests_per_minute, burst, max_concurrent)
+
+    def configure(self, requests_per_minute=None, burst=None, max_concurrent=None):
+        with self._cond:
+            if requests_per_minute is not None:
+                self.rate = requests_per_minute / 60.0
+            if burst is not None:
+                self.burst = max(1.0, burst)
+            if max_concurrent is not None:
+                self.max_concurrent = max(1, max_concurrent)
+            self._tokens = self.burst
+            self._updated = time.monotonic()
+            self._cond.notify_all()
+
+    def _refill_locked(self, now):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        else:
+            self._tokens = self.burst
+        self._updated = now
+
+    def _estimate_locked(self, ahead):
+        """Seconds until a call with `ahead` calls queued in front of it gets admitted"""
+        rate_wait = 0.0
+        if self.rate > 0:
+            rate_wait = max(0.0, ahead + 1 - self._tokens) / self.rate
+        latency = self._latency or DEFAULT_LATENCY_S
+        # Every max_concurrent calls in front of us is roughly one more call latency
+        overflow = self._in_flight + ahead + 1 - self.max_concurrent
+        slot_wait = max(0, overflow) / self.max_concurrent * latency
+        return max(rate_wait, slot_wait)
+
+    def estimated_wait(self, priority=NORMAL):
+        """Seconds a new call at this priority would wait right now"""
+        with self._cond:
+            self._refill_locked(time.monotonic())
+            ahead = sum(1 for entry in self._waiting if entry[0] <= priority)
+            return self._estimate_locked(ahead)
+
+    @contextmanager
+    def admit(self, priority=NORMAL, on_wait=None):
+        """Hold a model call slot; on_wait gets the estimated wait while queued and None once admitted"""
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill_locked(now)
+                    if self._waiting[0] == entry and self._in_flight < self.max_concurrent and self._tokens >= 1:
+                        break
+                    waited = True
+                    if on_wait:
+                        ahead = sum(1 for other in self._waiting if other < entry)
+                        on_wait(self._estimate_locked(ahead))
+                    timeout = POLL_SECONDS
+                    if self.rate > 0 and self._tokens < 1:
+                        timeout = min(timeout, (1 - self._tokens) / self.rate)
+                    self._cond.wait(timeout)
+                    check_cancelled()
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._tokens -= 1
+            self._in_flight += 1
+            self._admitted[priority] = self._admitted.get(priority, 0) + 1
+            self._wait_seconds[priority] = self._wait_seconds.get(priority, 0.0) + now - start
+            # The next waiter in line may fit as well
+            self._cond.notify_all()
+        if waited and on_wait:
+            on_wait(None)
+
+        call_start = time.monotonic()
+        try:
+            yield
+        finally:
+            latency = time.monotonic() - call_start
+            with self._cond:
+                self._in_flight -= 1
+                self._latency = latency if self._latency is None else (
+                    EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self._latency
+                )
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            self._refill_locked(time.monotonic())
+            queued = {}
+            for priority, _ in self._waiting:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                queued[name] = queued.get(name, 0) + 1
+            return {
+                "in_flight": self._in_flight,
+                "max_concurrent": self.max_concurrent,
+                "requests_per_minute": self.rate * 60,
+                "tokens": round(self._tokens, 2),
+                "queued": queued,
+                "admitted": {PRIORITY_NAMES.get(p, str(p)): n for p, n in self._admitted.items()},
+                "mean_wait_s": {
+                    PRIORITY_NAMES.get(p, str(p)): round(self._wait_seconds[p] / n, 3)
+                    for p, n in self._admitted.items()
+                },
+            }
+
+
+controller = AdmissionController()
+
+_call_context = contextvars.ContextVar("admission_context", default=(NORMAL, None))
+
+
+@contextmanager
+def call_context(priority, on_wait=None):
+    """Priority (or a callable returning it) and wait callback for model calls made inside this block"""
+    reset = _call_context.set((priority, on_wait))
+    try:
+        yield
+    finally:
+        _call_context.reset(reset)
+
+
+def current_priority():
+    priority = _call_context.get()[0]
+    return priority() if callable(priority) else priority
+
+
+def priority_for(kind):
+    return KIND_PRIORITIES.get(kind, NORMAL)
+
+
+def admit():
+    """Wait for a model call slot at the current call context's priority"""
+    return controller.admit(current_priority(), _call_context.get()[1])
+
+
+def estimated_wait(kind):
+    return controller.estimated_wait(priority_for(kind))
+
+
+def stats():
+    return controller.stats()
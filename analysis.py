@@ -0,0 +1,310 @@
+import re
+import textwrap
+import time
+from model_backend import get_model
+from cancellation import AnalysisCancelled, check_cancelled
+from model_router import router
+from admission import admit
+from request_planner import needs_image, build_contents, check_input_budget, record_usage
+from pcos_rules import PCOS_SCORING, score_meal
+from similar_meals import similar_meals
+from item_cache import parse_food_items, unparsed_lines, parse_item_nutrition, item_nutrition_prompt, compose_nutrition, lookup_items
+
+def get_gemini_response(input_text, image, prompt):
+    try:
+        # Stop before spending quota on work nobody is waiting for
+        check_cancelled()
+        stage, model_name = router.route(input_text)
+        model = get_model(model_name)
+        contents = build_contents(input_text, image, prompt)
+        input_tokens = check_input_budget(model, input_text, contents)
+
+        # Waits for the shared rate limit, interactive calls go first
+        with admit():
+            start = time.monotonic()
+            try:
+                response = model.generate_content(contents, generation_config=stage.generation_config())
+                text = response.text
+            except Exception:
+                router.record(input_text, model_name, time.monotonic() - start, ok=False)
+                raise
+            router.record(input_text, model_name, time.monotonic() - start)
+
+        record_usage(input_text, response, input_tokens)
+        return text
+    except AnalysisCancelled:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Failed to get response from Gemini: {e}")
+
+def parse_nutritional_values(llm_response):
+    nutritional_values = {
+        'protein': 0,
+        'fat': 0,
+        'carbs': 0,
+        'fiber': 0
+    }
+
+    try:
+        # 更严格的匹配模式
+        patterns = [
+            r'(\w+):\s*(\d+(?:\.\d+)?)\s*%?',  # 匹配百分比或没有百分比的数字
+        ]
+
+        for pattern in patterns:
+            matches = re.findall(pattern, llm_response, re.IGNORECASE)
+            for nutrient, value in matches:
+                nutrient = nutrient.lower().strip()
+                if nutrient in nutritional_values:
+                    try:
+                        nutritional_values[nutrient] = round(float(value))
+                    except ValueError:
+                        continue
+
+        return nutritional_values
+    except Exception:
+        return nutritional_values  # 返回默认值
+
+def get_pcos_analysis(food_items, image_content, meal_type, symptoms=None, dietary_preference=''):
+    # Symptoms and dietary preference are passed in so this can run off the script thread
+    symptoms = symptoms or []
+
+    pcos_prompt = textwrap.dedent(f"""
+    You are a nutritionist specializing in managing PCOS (Polycystic Ovary Syndrome) through diet.
+    
+    Meal Information:
+    Time: {meal_type}
+    Dietary Preference: {dietary_preference}
+    User Symptoms: {', '.join(symptoms)}
+    Food Items: {food_items}
+    
+    Provide concise, structured feedback without detailed explanations following exactly this format:
+    
+    PCOS_SCORE: [Promising/Can Do Better/Needs Improvement]
+    
+    FOCUS_AREAS:
+    Hormonal Balance & Insulin Sensitivity|[1-5]|[brief explanation]
+    Inflammation Control & Gut Health|[1-5]|[brief explanation]
+    Energy & Mental Health|[1-5]|[brief explanation]
+    Reproductive Health & Fertility|[1-5]|[brief explanation]
+    
+    SUGGESTIONS:
+    Quick Fix: [immediate adjustment]
+    Swap Out: [healthier alternative]
+    Pro Moves: [advanced recommendation]
+    """)
+    
+    # Text-only once the user has confirmed the food items
+    image = image_content if needs_image("PCOS Analysis", food_items) else None
+    return get_gemini_response("PCOS Analysis", image, pcos_prompt)
+
+def get_pcos_suggestions(food_items, meal_type, pcos_data, symptoms=None, dietary_preference='', conflicts=None):
+    """Ask only for the free-text suggestions, the scores are already known"""
+    scores = "\n".join(
+        f"{area}: {data['score']}/5 ({data['explanation']})" for area, data in pcos_data['focus_areas'].items()
+    )
+    notes = f"\nNote: the meal {'; '.join(conflicts)}." if conflicts else ""
+    suggestions_prompt = textwrap.dedent(f"""
+    You are a nutritionist specializing in PCOS. This {meal_type} was rated {pcos_data['pcos_score']}.
+    Dietary Preference: {dietary_preference}
+    User Symptoms: {', '.join(symptoms or [])}
+    Food Items: {food_items}
+    Scores:
+    """) + scores + notes + textwrap.dedent("""
+
+    Reply with exactly these three lines, one short sentence each:
+    SUGGESTIONS:
+    Quick Fix: [immediate adjustment]
+    Swap Out: [healthier alternative]
+    Pro Moves: [advanced recommendation]
+    """)
+    return get_gemini_response("PCOS Suggestions", None, suggestions_prompt)
+
+def parse_pcos_response(response_text):
+    """Parse PCOS analysis response into structured data"""
+    lines = response_text.strip().split('\n')
+    data = {
+        'pcos_score': '',
+        'focus_areas': {},
+        'suggestions': {}
+    }
+    
+    current_section = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+            
+        if line.startswith('PCOS_SCORE:'):
+            data['pcos_score'] = line.split(':', 1)[1].strip()
+            
+        elif 'FOCUS_AREAS:' in line:
+            current_section = 'focus_areas'
+            continue
+            
+        elif 'SUGGESTIONS:' in line:
+            current_section = 'suggestions'
+            continue
+            
+        if current_section == 'focus_areas':
+            if '|' in line:
+                try:
+                    area, score, explanation = line.split('|')
+                    # 添加错误处理来确保score是一个有效的数字
+                    score_str = score.strip('[]').strip()
+                    try:
+                        score_value = int(score_str)
+                        data['focus_areas'][area.strip()] = {
+                            'score': score_value,
+                            'explanation': explanation.strip()
+                        }
+                    except ValueError:
+                        # 如果无法解析为整数，使用默认值3
+                        data['focus_areas'][area.strip()] = {
+                            'score': 3,
+                            'explanation': explanation.strip()
+                        }
+                except Exception:
+                    continue
+                
+        elif current_section == 'suggestions':
+            if ':' in line:
+                key, value = line.split(':', 1)
+                data['suggestions'][key.lower().replace(' ', '_')] = value.strip()
+    
+    return data
+
+def get_daily_digest(meals, symptoms=None, dietary_preference=''):
+    """One text-only request covering every meal of a day"""
+    meal_lines = []
+    for number, meal in enumerate(meals, 1):
+        macros = ", ".join(f"{nutrient} {value}%" for nutrient, value in meal.nutritional_values.items())
+        items = "; ".join(line.strip().lstrip('•-* ') for line in meal.details.split('\n') if line.strip())
+        meal_lines.append(
+            f"Meal {number} ({meal.meal_type or 'Meal'}, {meal.time}): {items}"
+            + (f" [{macros}]" if macros else "")
+            + (f" rated {meal.pcos_score}" if meal.pcos_score else "")
+        )
+    digest_prompt = textwrap.dedent(f"""
+    You are a nutritionist specializing in PCOS. Review this whole day of eating.
+    Dietary Preference: {dietary_preference}
+    User Symptoms: {', '.join(symptoms or [])}
+    """) + "\n".join(meal_lines) + textwrap.dedent("""
+
+    Provide the review in this exact format:
+    DAY_SCORE: [Promising/Can Do Better/Needs Improvement]
+    SUMMARY: [two sentences on the day as a whole]
+    MEAL_DELTAS:
+    [meal number]|[-2 to +2, how much the meal helped or hurt the day]|[short reason]
+    TOMORROW: [one concrete change for tomorrow]
+    """)
+    return get_gemini_response("Daily Digest", None, digest_prompt)
+
+def parse_daily_digest(response_text, meal_count):
+    """Parse the daily digest, meal deltas keyed by 0-based meal position"""
+    data = {'day_score': '', 'summary': '', 'meal_deltas': {}, 'tomorrow': ''}
+    for line in response_text.strip().split('\n'):
+        line = line.strip().lstrip('•-* ')
+        if line.startswith('DAY_SCORE:'):
+            data['day_score'] = line.split(':', 1)[1].strip()
+        elif line.startswith('SUMMARY:'):
+            data['summary'] = line.split(':', 1)[1].strip()
+        elif line.startswith('TOMORROW:'):
+            data['tomorrow'] = line.split(':', 1)[1].strip()
+        elif line.count('|') == 2:
+            number, delta, reason = (part.strip() for part in line.split('|'))
+            try:
+                position = int(re.sub(r'\D', '', number)) - 1
+                delta = min(max(int(delta.replace('+', '')), -2), 2)
+            except ValueError:
+                continue
+            if 0 <= position < meal_count:
+                data['meal_deltas'][position] = {'delta': delta, 'reason': reason}
+    return data
+
+def detect_food_items(image_content):
+    """Detect food items from image"""
+    detection_prompt = """
+    List only the food items and their estimated weight in the image.
+    Format as bullet points.
+    Example format:
+    • 1 slice of chocolate cake (150g)
+    • 2 scoops of vanilla ice cream (100g)
+    """
+    return get_gemini_response("Food Detection", image_content, detection_prompt)
+
+def get_nutrition_analysis(food_items, image_content):
+    """Get nutritional analysis for the confirmed food items"""
+    nutrition_prompt = textwrap.dedent(f"""
+        Provide a nutritional analysis for the following dish:
+        {food_items}
+        Just simply display(no extra wordings) the nutritional values as percentages for protein, fat, carbs, and fiber.
+        Format your response like this:
+        Protein: X%
+        Fat: Y%
+        Carbs: Z%
+        Fiber: W%
+        Where X, Y, Z, and W are numeric values.
+        """)
+    image = image_content if needs_image("Nutrition Analysis", food_items) else None
+    return get_gemini_response("Nutrition Analysis", image, nutrition_prompt)
+
+def get_item_nutrition(items):
+    """Per-100g nutrient values for food items the cache hasn't seen"""
+    response = get_gemini_response("Item Nutrition", None, item_nutrition_prompt(items))
+    return parse_item_nutrition(response, items)
+
+def get_meal_nutrition(food_items, image_content):
+    """Compose meal nutrition from cached per-item values, analyzing only new items"""
+    items = parse_food_items(food_items)
+    # Breaking the meal down would silently leave out lines that didn't parse
+    if items and not unparsed_lines(food_items):
+        per_100g, _ = lookup_items(items, get_item_nutrition)
+        if all(item.name in per_100g for item in items):
+            return compose_nutrition(items, per_100g)
+
+    # Fall back to analyzing the whole meal when the items can't be broken down
+    nutrition_response = get_nutrition_analysis(food_items, image_content)
+    return parse_nutritional_values(nutrition_response)
+
+def analyze_meal(food_items, image_content, meal_type, symptoms=None, dietary_preference='', progress=None):
+    """Run nutrition and PCOS analysis for a meal"""
+    # Habitual meals are answered from a close enough earlier analysis
+    match = similar_meals.lookup(food_items, meal_type, symptoms, dietary_preference)
+    if match is not None:
+        result, similarity = match
+        if progress:
+            progress(f"Reusing the analysis of a similar meal ({similarity:.0%} match)")
+        return result
+
+    if progress:
+        progress("Analyzing nutrition...")
+    nutritional_values = get_meal_nutrition(food_items, image_content)
+
+    if progress:
+        progress("Analyzing PCOS impact...")
+    # The rules would read all-zero nutrition from a failed analysis as a meal without macros
+    if PCOS_SCORING == "local" and any(nutritional_values.values()):
+        # Scores come from the rule tables, the model only writes the suggestions
+        pcos_data = score_meal(food_items, nutritional_values, symptoms, dietary_preference)
+        conflicts = pcos_data.pop('preference_conflicts')
+        try:
+            suggestions_response = get_pcos_suggestions(
+                food_items, meal_type, pcos_data, symptoms, dietary_preference, conflicts
+            )
+            pcos_data['suggestions'] = parse_pcos_response(suggestions_response)['suggestions']
+        except RuntimeError:
+            # The scores are still worth showing without suggestions
+            pass
+    else:
+        pcos_response = get_pcos_analysis(food_items, image_content, meal_type, symptoms, dietary_preference)
+        pcos_data = parse_pcos_response(pcos_response)
+
+    result = {
+        'nutritional_values': nutritional_values,
+        'pcos_analysis': pcos_data
+    }
+    # Only complete analyses are worth handing to later meals
+    if pcos_data.get('suggestions'):
+        similar_meals.add(food_items, meal_type, symptoms, dietary_preference, result)
+    return result
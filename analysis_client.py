@@ -0,0 +1,104 @@
+import base64
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import analysis
+from request_planner import needs_image
+from admission import current_priority
+
+# When set, analysis runs in the standalone service instead of this process
+ANALYSIS_SERVICE_URL = os.getenv("ANALYSIS_SERVICE_URL", "")
+POOL_SIZE = int(os.getenv("ANALYSIS_CLIENT_POOL", "16"))
+TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_CLIENT_TIMEOUT", "60"))
+
+
+class AnalysisClient:
+    """Pooled HTTP client for the analysis service"""
+
+    def __init__(self, base_url, pool_size=POOL_SIZE, timeout=TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path, payload):
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Analysis service unavailable: {e}")
+        if response.status_code != 200:
+            try:
+                message = response.json().get("error", response.reason)
+            except ValueError:
+                message = response.reason
+            raise RuntimeError(f"Analysis service error: {message}")
+        return response.json()
+
+    @staticmethod
+    def _image_payload(image_content):
+        if not image_content:
+            return {}
+        return {
+            "images": [
+                {"image": base64.b64encode(part["data"]).decode("ascii"), "mime_type": part["mime_type"]}
+                for part in image_content
+            ]
+        }
+
+    def detect_food_items(self, image_content):
+        payload = self._image_payload(image_content)
+        payload["priority"] = current_priority()
+        return self._post("/detect", payload)["text"]
+
+    def analyze_meal(self, food_items, image_content, meal_type, symptoms=None, dietary_preference='', progress=None):
+        if progress:
+            progress("Waiting for the analysis service...")
+        # Skip uploading the photo when no stage will look at it
+        payload = self._image_payload(image_content) if needs_image("Nutrition Analysis", food_items) else {}
+        payload.update({
+            "food_items": food_items,
+            "meal_type": meal_type,
+            "symptoms": symptoms or [],
+            "dietary_preference": dietary_preference,
+            "priority": current_priority(),
+        })
+        return self._post("/analyze", payload)
+
+    def get_daily_digest(self, meals, symptoms=None, dietary_preference=''):
+        # Only the text fields the digest prompt uses, never the photos
+        payload = {
+            "meals": [
+                {
+                    "meal_type": meal.meal_type,
+                    "time": meal.time,
+                    "details": meal.details,
+                    "pcos_score": meal.pcos_score,
+                    "nutritional_values": meal.nutritional_values,
+                }
+                for meal in meals
+            ],
+            "symptoms": symptoms or [],
+            "dietary_preference": dietary_preference,
+            "priority": current_priority(),
+        }
+        return self._post("/digest", payload)["text"]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Return the analysis pipeline, remote if ANALYSIS_SERVICE_URL is set"""
+    global _client
+    if not ANALYSIS_SERVICE_URL:
+        return analysis
+    with _client_lock:
+        if _client is None:
+            _client = AnalysisClient(ANALYSIS_SERVICE_URL)
+        return _client
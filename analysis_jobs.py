@@ -0,0 +1,276 @@
+import itertools
+import os
+import threading
+import time
+import uuid
+
+from cancellation import (
+    AnalysisCancelled, registry, active_token, session_scope, SUPERSEDED, NAVIGATION
+)
+from admission import call_context, priority_for, estimated_wait, MAX_CONCURRENT
+from meal_records import MealRecord
+from image_store import session_images
+
+# Worker threads shared by every session in this server process. Well above the model call
+# limit, so jobs mostly wait in the admission controller where calls go in priority order
+MAX_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(MAX_CONCURRENT * 2)))
+# Used for queue wait estimates until real job durations have been seen
+DEFAULT_JOB_SECONDS = 6.0
+EWMA_ALPHA = 0.3
+# Finished jobs nobody collected are dropped after this many seconds
+JOB_TTL_SECONDS = int(os.getenv("ANALYSIS_JOB_TTL", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+SESSION_KEY = "_analysis_session_id"
+
+
+class AnalysisJob:
+    """A unit of analysis work running in the background worker pool"""
+
+    def __init__(self, session_id, kind, meta=None, cancel_token=None, on_expire=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.kind = kind
+        self.meta = meta or {}
+        self.cancel_token = cancel_token
+        self.status = QUEUED
+        self.progress = "Waiting for a free worker..."
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # Estimated seconds until the current model call gets a slot, None when not waiting
+        self.wait_estimate = None
+        # Set once the result has been shown on the Recommendations page or logged
+        self.delivered = False
+        # Called with the job when it is dropped after JOB_TTL_SECONDS without being discarded first
+        self.on_expire = on_expire
+
+    @property
+    def is_finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def elapsed(self):
+        end = self.finished or time.time()
+        return end - (self.started or self.created)
+
+
+def _pending_order(entry):
+    # Looked up when a worker frees up, so a promoted speculative job moves ahead right away
+    seq, job = entry[:2]
+    return priority_for(job.kind), seq
+
+
+class JobQueue:
+    """Process-wide background job queue with status polling, started in priority order by job kind"""
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        # (seq, job, fn, args, kwargs) for jobs waiting for a worker
+        self._pending = []
+        self._seq = itertools.count()
+        self._workers = 0
+        self._idle = 0
+        self._running = 0
+        self._duration = None
+
+    def submit(self, session_id, kind, fn, *args, meta=None, cancel_token=None, on_expire=None, **kwargs):
+        """Queue fn to run in the background and return the new job id"""
+        job = AnalysisJob(session_id, kind, meta, cancel_token, on_expire)
+        with self._lock:
+            self._prune_locked()
+            self._jobs[job.id] = job
+            self._pending.append((next(self._seq), job, fn, args, kwargs))
+            if self._idle < len(self._pending) and self._workers < self.max_workers:
+                self._workers += 1
+                threading.Thread(
+                    target=self._worker, name=f"analysis_{self._workers}", daemon=True
+                ).start()
+            self._ready.notify()
+        return job.id
+
+    def _worker(self):
+        while True:
+            with self._ready:
+                while not self._pending:
+                    self._idle += 1
+                    self._ready.wait()
+                    self._idle -= 1
+                entry = min(self._pending, key=_pending_order)
+                self._pending.remove(entry)
+                self._running += 1
+            _, job, fn, args, kwargs = entry
+            try:
+                self._run(job, fn, args, kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    if job.status == DONE:
+                        duration = job.finished - job.started
+                        self._duration = duration if self._duration is None else (
+                            EWMA_ALPHA * duration + (1 - EWMA_ALPHA) * self._duration
+                        )
+
+    def wait_estimate(self, job):
+        """Seconds until the job's next model call starts, counting jobs queued ahead of it; None when not waiting"""
+        if job.status != QUEUED:
+            return job.wait_estimate
+        with self._lock:
+            entry = next((entry for entry in self._pending if entry[1] is job), None)
+            if entry is None:
+                return job.wait_estimate
+            order = _pending_order(entry)
+            ahead = sum(1 for other in self._pending if _pending_order(other) < order)
+            # Every max_workers jobs in front of this one is roughly one more job duration
+            overflow = self._running + ahead + 1 - self.max_workers
+            queue_wait = max(0, overflow) / self.max_workers * (self._duration or DEFAULT_JOB_SECONDS)
+        return queue_wait + estimated_wait(job.kind)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started = time.time()
+        job.progress = "Starting analysis..."
+
+        def report(message):
+            job.progress = message
+
+        def waiting(estimate):
+            job.wait_estimate = estimate
+
+        try:
+            # Priority is looked up per model call, a speculative job can be promoted mid-run
+            with active_token(job.cancel_token), call_context(lambda: priority_for(job.kind), waiting):
+                if job.cancel_token is not None:
+                    job.cancel_token.check()
+                job.result = fn(*args, progress=report, **kwargs)
+                # Work that finished after being superseded is still thrown away
+                if job.cancel_token is not None:
+                    job.cancel_token.check()
+            job.status = DONE
+            job.progress = "Analysis complete"
+        except AnalysisCancelled as e:
+            job.error = str(e)
+            job.status = CANCELLED
+            job.progress = "Analysis cancelled"
+            job.delivered = True
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            job.progress = "Analysis failed"
+        finally:
+            job.finished = time.time()
+            job.wait_estimate = None
+            if job.cancel_token is not None:
+                registry.release(job.cancel_token)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, session_id):
+        """All jobs for a session, oldest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.session_id == session_id]
+        return sorted(jobs, key=lambda job: job.created)
+
+    def discard(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune_locked(self):
+        cutoff = time.time() - JOB_TTL_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.is_finished and job.finished < cutoff
+        ]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job.on_expire is not None:
+                job.on_expire(job)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the job queue shared by all sessions in this process"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def session_id(session_state):
+    """Stable id for the current browser session"""
+    if SESSION_KEY not in session_state:
+        session_state[SESSION_KEY] = uuid.uuid4().hex
+    return session_state[SESSION_KEY]
+
+
+def pending_jobs(session_state):
+    """Analysis jobs for this session whose results have not been shown or logged yet"""
+    queue = get_job_queue()
+    return [
+        job for job in queue.jobs_for(session_id(session_state))
+        if job.kind == "analysis" and not job.delivered
+    ]
+
+
+def new_cancel_token(session_state, kind):
+    """Cancellation token for work on the session's current upload"""
+    sid = session_id(session_state)
+    session_scope(session_state, sid)
+    return registry.token(sid, session_state.get('current_file_key'), kind)
+
+
+def cancel_superseded(session_state, file_key):
+    """Cancel work for every upload except file_key"""
+    return registry.cancel(session_id(session_state), SUPERSEDED, keep_file_key=file_key)
+
+
+def cancel_on_navigation(session_state):
+    """Detection is only useful on the upload page, analyses keep running"""
+    return registry.cancel(session_id(session_state), NAVIGATION, kind="detection")
+
+
+def job_image_key(job_id):
+    return f"job:{job_id}"
+
+
+def release_job_images(session_state):
+    """Let go of photos held for analyses that were shown, logged, dismissed or expired"""
+    queue = get_job_queue()
+
+    def live(key):
+        if not key.startswith("job:"):
+            return True
+        job = queue.get(key[len("job:"):])
+        return job is not None and not job.delivered
+
+    session_images(session_state).prune(live)
+
+
+def job_to_meal(job):
+    """Build a meal log entry from a finished analysis job"""
+    result = job.result or {}
+    return MealRecord(
+        meal_type=job.meta.get('meal_type', ''),
+        name=job.meta.get('meal_name', 'Unknown Meal'),
+        details=job.meta.get('food_items', ''),
+        time=job.meta.get('time', ''),
+        date=job.meta.get('date', ''),
+        image=job.meta.get('image'),
+        nutritional_values=result.get('nutritional_values'),
+        pcos_analysis=result.get('pcos_analysis'),
+    )
@@ -0,0 +1,225 @@
+"""Standalone HTTP service for the detection/nutrition/PCOS pipeline
+
+Run with:
+    python analysis_service.py --port 8765 --workers 8
+    MODEL_BACKEND=stub python analysis_service.py   # local stub model, no API calls
+
+Point the Streamlit pages at it with ANALYSIS_SERVICE_URL=http://localhost:8765
+and serve meal images from it with IMAGE_BASE_URL=http://localhost:8765/images
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.ioloop
+import tornado.web
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.process import fork_processes
+
+import admission
+import analysis
+import cassette
+import model_backend
+from image_store import IMAGE_DIR
+from item_cache import cache_stats as item_cache_stats
+from meal_records import MealRecord
+from similar_meals import stats as similar_meals_stats
+from model_router import router
+from request_planner import needs_image, usage_stats
+from result_cache import ResultCache
+
+CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+
+
+def cache_key(stage, *parts):
+    digest = hashlib.sha256(stage.encode())
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(json.dumps(part, sort_keys=True).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def decode_image(payload):
+    """Turn the JSON image payload back into Gemini image parts"""
+    images = payload.get("images") or ([payload] if payload.get("image") else [])
+    if not images:
+        return None
+    return [
+        {"mime_type": image.get("mime_type", "image/png"), "data": base64.b64decode(image["image"])}
+        for image in images
+    ]
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, executor, cache):
+        self.executor = executor
+        self.cache = cache
+
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/json")
+
+    def read_json(self):
+        try:
+            return json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Invalid JSON body")
+
+    def read_priority(self, payload, default):
+        try:
+            priority = int(payload.get("priority", default))
+        except (TypeError, ValueError):
+            raise tornado.web.HTTPError(400, reason="Invalid priority")
+        return min(max(priority, admission.INTERACTIVE), admission.BACKGROUND)
+
+    async def run_cached(self, key, priority, fn, *args, **kwargs):
+        result = self.cache.get(key)
+        if result is None:
+            def run():
+                with admission.call_context(priority):
+                    return fn(*args, **kwargs)
+
+            loop = tornado.ioloop.IOLoop.current()
+            result = await loop.run_in_executor(self.executor, run)
+            self.cache.put(key, result)
+        return result
+
+    def write_error(self, status_code, **kwargs):
+        message = self._reason
+        if "exc_info" in kwargs:
+            error = kwargs["exc_info"][1]
+            message = getattr(error, "reason", None) or str(error)
+        self.finish(json.dumps({"error": message}))
+
+
+class DetectHandler(BaseHandler):
+    async def post(self):
+        payload = self.read_json()
+        image_content = decode_image(payload)
+        if image_content is None:
+            raise tornado.web.HTTPError(400, reason="Missing image")
+        key = cache_key("detect", *(part["data"] for part in image_content))
+        priority = self.read_priority(payload, admission.INTERACTIVE)
+        text = await self.run_cached(key, priority, analysis.detect_food_items, image_content)
+        self.write({"text": text})
+
+
+class AnalyzeHandler(BaseHandler):
+    async def post(self):
+        payload = self.read_json()
+        image_content = decode_image(payload)
+        food_items = payload.get("food_items", "")
+        meal_type = payload.get("meal_type", "")
+        symptoms = payload.get("symptoms", [])
+        dietary_preference = payload.get("dietary_preference", "")
+        image_used = image_content and needs_image("Nutrition Analysis", food_items)
+        key = cache_key(
+            "analyze",
+            *(part["data"] for part in (image_content if image_used else [])),
+            food_items, meal_type, symptoms, dietary_preference
+        )
+        priority = self.read_priority(payload, admission.NORMAL)
+        result = await self.run_cached(
+            key, priority, analysis.analyze_meal, food_items, image_content, meal_type,
+            symptoms=symptoms, dietary_preference=dietary_preference
+        )
+        self.write(result)
+
+
+class DigestHandler(BaseHandler):
+    async def post(self):
+        payload = self.read_json()
+        meal_payloads = payload.get("meals") or []
+        if not meal_payloads:
+            raise tornado.web.HTTPError(400, reason="Missing meals")
+        meals = [
+            MealRecord(
+                meal_type=meal.get("meal_type", ""),
+                time=meal.get("time", ""),
+                details=meal.get("details", ""),
+                nutritional_values=meal.get("nutritional_values"),
+                pcos_analysis={"pcos_score": meal.get("pcos_score", "")},
+            )
+            for meal in meal_payloads
+        ]
+        symptoms = payload.get("symptoms", [])
+        dietary_preference = payload.get("dietary_preference", "")
+        key = cache_key("digest", meal_payloads, symptoms, dietary_preference)
+        priority = self.read_priority(payload, admission.NORMAL)
+        text = await self.run_cached(
+            key, priority, analysis.get_daily_digest, meals,
+            symptoms=symptoms, dietary_preference=dietary_preference
+        )
+        self.write({"text": text})
+
+
+class ImageHandler(tornado.web.StaticFileHandler):
+    """Content-addressed meal images, a URL's bytes never change"""
+    CACHE_MAX_AGE = 365 * 24 * 3600
+
+    def get_cache_time(self, path, modified, mime_type):
+        return self.CACHE_MAX_AGE
+
+    def set_extra_headers(self, path):
+        self.set_header("Cache-Control", f"public, max-age={self.CACHE_MAX_AGE}, immutable")
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write({
+            "status": "ok",
+            "pid": os.getpid(),
+            "cache": self.cache.stats(),
+            "item_cache": item_cache_stats(),
+            "similar_meals": similar_meals_stats(),
+            "token_usage": usage_stats(),
+            "routing": router.stats(),
+            "admission": admission.stats(),
+            "cassette": cassette.stats() if model_backend.CASSETTE_MODE else None,
+        })
+
+
+def make_app(workers=None, cache=None):
+    executor = ThreadPoolExecutor(max_workers=workers or int(os.getenv("ANALYSIS_WORKERS", "8")))
+    context = {"executor": executor, "cache": cache or ResultCache(CACHE_SIZE)}
+    return tornado.web.Application([
+        (r"/detect", DetectHandler, context),
+        (r"/analyze", AnalyzeHandler, context),
+        (r"/digest", DigestHandler, context),
+        (r"/health", HealthHandler, context),
+        (r"/images/([0-9a-f]{64}\.(?:png|jpg|webp))", ImageHandler, {"path": IMAGE_DIR}),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Meal analysis service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8, help="worker threads per process")
+    parser.add_argument("--processes", type=int, default=1, help="0 forks one process per CPU core")
+    args = parser.parse_args()
+
+    sockets = bind_sockets(args.port, address=args.host)
+    if args.processes != 1:
+        # Each process gets its share of the model call budget
+        processes = args.processes or os.cpu_count()
+        admission.controller.configure(
+            requests_per_minute=admission.REQUESTS_PER_MINUTE / processes,
+            burst=admission.BURST / processes,
+            max_concurrent=max(1, admission.MAX_CONCURRENT // processes),
+        )
+        fork_processes(args.processes)
+    server = HTTPServer(make_app(workers=args.workers))
+    server.add_sockets(sockets)
+    print(f"Analysis service listening on http://{args.host}:{args.port} (pid {os.getpid()})")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,21 @@
 import streamlit as st 
-import os
-from dotenv import load_dotenv
 from PIL import Image
-import google.generativeai as genai
 import streamlit.components.v1 as components
-import textwrap
-import re
 from datetime import datetime
 import io
-import json
-
-# Load environment variables
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+from memory_budget import enforce_budget
+from meal_index import index_meal
+from meal_records import MealRecord, get_meal_log
+from analysis_client import get_pipeline
+from analysis_jobs import (
+    get_job_queue, session_id, new_cancel_token, cancel_superseded, job_image_key, release_job_images,
+    DONE, FAILED, CANCELLED
+)
+from rerun_profiler import profile_rerun
+from speculation import start_speculation, claim_speculation, drop_speculation
+from local_classifier import local_detect
+from image_store import session_images, image_html
+from frame_quality import assess_frame, best_frame, CapturedFrame, BURST_SIZE
 
 # Unified CSS styles
 css = """
@@ -103,14 +106,6 @@ def navigation():
         if st.button("📝\nMeal Log", use_container_width=True):
             st.switch_page("pages/3_Meal_Log.py")
 
-def get_gemini_response(input_text, image, prompt):
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content([input_text, image[0], prompt])
-        return response.text
-    except Exception as e:
-        raise RuntimeError(f"Failed to get response from Gemini: {e}")
-
 def input_image_setup(uploaded_file):
     if uploaded_file is not None:
         bytes_data = uploaded_file.getvalue()
@@ -119,120 +114,6 @@ def input_image_setup(uploaded_file):
     else:
         raise FileNotFoundError("No file uploaded")
 
-def parse_nutritional_values(llm_response):
-    nutritional_values = {
-        'protein': 0,
-        'fat': 0,
-        'carbs': 0,
-        'fiber': 0
-    }
-
-    try:
-        # 更严格的匹配模式
-        patterns = [
-            r'(\w+):\s*(\d+(?:\.\d+)?)\s*%?',  # 匹配百分比或没有百分比的数字
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, llm_response, re.IGNORECASE)
-            for nutrient, value in matches:
-                nutrient = nutrient.lower().strip()
-                if nutrient in nutritional_values:
-                    try:
-                        nutritional_values[nutrient] = round(float(value))
-                    except ValueError:
-                        continue
-
-        return nutritional_values
-    except Exception:
-        return nutritional_values  # 返回默认值
-
-def get_pcos_analysis(food_items, image_content, meal_type):
-    # Get user symptoms and dietary preference from session state
-    symptoms = st.session_state.get('selected_symptoms', [])
-    dietary_preference = st.session_state.get('dietary_preference', '')
-    
-    pcos_prompt = textwrap.dedent(f"""
-    You are a nutritionist specializing in managing PCOS (Polycystic Ovary Syndrome) through diet.
-    
-    Meal Information:
-    Time: {meal_type}
-    Dietary Preference: {dietary_preference}
-    User Symptoms: {', '.join(symptoms)}
-    Food Items: {food_items}
-    
-    Provide concise, structured feedback without detailed explanations following exactly this format:
-    
-    PCOS_SCORE: [Promising/Can Do Better/Needs Improvement]
-    
-    FOCUS_AREAS:
-    Hormonal Balance & Insulin Sensitivity|[1-5]|[brief explanation]
-    Inflammation Control & Gut Health|[1-5]|[brief explanation]
-    Energy & Mental Health|[1-5]|[brief explanation]
-    Reproductive Health & Fertility|[1-5]|[brief explanation]
-    
-    SUGGESTIONS:
-    Quick Fix: [immediate adjustment]
-    Swap Out: [healthier alternative]
-    Pro Moves: [advanced recommendation]
-    """)
-    
-    return get_gemini_response("PCOS Analysis", image_content, pcos_prompt)
-
-def parse_pcos_response(response_text):
-    """Parse PCOS analysis response into structured data"""
-    lines = response_text.strip().split('\n')
-    data = {
-        'pcos_score': '',
-        'focus_areas': {},
-        'suggestions': {}
-    }
-    
-    current_section = None
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        if line.startswith('PCOS_SCORE:'):
-            data['pcos_score'] = line.split(':', 1)[1].strip()
-            
-        elif 'FOCUS_AREAS:' in line:
-            current_section = 'focus_areas'
-            continue
-            
-        elif 'SUGGESTIONS:' in line:
-            current_section = 'suggestions'
-            continue
-            
-        if current_section == 'focus_areas':
-            if '|' in line:
-                try:
-                    area, score, explanation = line.split('|')
-                    # 添加错误处理来确保score是一个有效的数字
-                    score_str = score.strip('[]').strip()
-                    try:
-                        score_value = int(score_str)
-                        data['focus_areas'][area.strip()] = {
-                            'score': score_value,
-                            'explanation': explanation.strip()
-                        }
-                    except ValueError:
-                        # 如果无法解析为整数，使用默认值3
-                        data['focus_areas'][area.strip()] = {
-                            'score': 3,
-                            'explanation': explanation.strip()
-                        }
-                except Exception:
-                    continue
-                
-        elif current_section == 'suggestions':
-            if ':' in line:
-                key, value = line.split(':', 1)
-                data['suggestions'][key.lower().replace(' ', '_')] = value.strip()
-    
-    return data
-
 def nutrition_bar_chart(nutritional_values):
     """Create nutrition bar chart"""
     try:
@@ -316,30 +197,242 @@ def format_meal_output(detected_items, meal_type):
     
     return output, meal_name
 
-def handle_image_upload(uploaded_file):
+def handle_image_upload(uploaded_files):
     """Handle image upload logic"""
-    if uploaded_file:
-        file_key = hash(uploaded_file.getvalue())
+    if uploaded_files:
+        file_key = hash(tuple(hash(uploaded_file.getvalue()) for uploaded_file in uploaded_files))
         
         if st.session_state.current_file_key != file_key:
+            # Work still running for the previous photo is no longer wanted
+            cancel_superseded(st.session_state, file_key)
             st.session_state.current_file_key = file_key
             st.session_state.detection_complete = False
             st.session_state.original_detection = None
             st.session_state.edited_food_items = None
+            st.session_state.detection_job_ids = {}
+            st.session_state.analysis_job_id = None
+            # A head start on the previous photo that was never used is wasted work
+            drop_speculation(st.session_state)
+            st.session_state.detection_source = None
+            # Shown by URL so reruns don't resend the photos, the previous upload's files are released
+            st.session_state.uploaded_images = session_images(st.session_state).store_all(
+                "upload", [(uploaded_file.getvalue(), uploaded_file.type) for uploaded_file in uploaded_files]
+            )
             
         return True
     return False
 
-def detect_food_items(image_content):
-    """Detect food items from image"""
-    detection_prompt = """
-    List only the food items and their estimated weight in the image.
-    Format as bullet points.
-    Example format:
-    • 1 slice of chocolate cake (150g)
-    • 2 scoops of vanilla ice cream (100g)
+def camera_capture():
+    """Camera path: check each shot locally and keep the best of the last few"""
+    if 'camera_frames' not in st.session_state:
+        st.session_state.camera_frames = []
+    frames = st.session_state.camera_frames
+
+    shot = st.camera_input("Take a photo of your meal", key="camera_photo")
+    if shot is not None:
+        data = shot.getvalue()
+        if not any(data == frame for frame, _ in frames) and data != st.session_state.get('rejected_frame'):
+            quality = assess_frame(data)
+            if quality.usable:
+                frames.append((data, quality))
+                del frames[:-BURST_SIZE]
+                st.session_state.rejected_frame = None
+            else:
+                # Rejected before it costs a model call
+                st.session_state.rejected_frame = data
+                st.session_state.rejected_reason = (
+                    f"Photo not used: {', '.join(quality.problems)} "
+                    f"(checked in {quality.elapsed_ms:.0f} ms). Clear it and try again."
+                )
+        if data == st.session_state.get('rejected_frame'):
+            st.warning(st.session_state.rejected_reason)
+
+    if not frames:
+        return []
+
+    best = best_frame(frames)
+    if len(frames) > 1:
+        st.caption(f"Using the sharpest of your last {len(frames)} shots. Clear the photo to take another.")
+    else:
+        st.caption("Clear the photo and take another shot if you like, the best one is used.")
+    if st.button("Start over", key="reset_camera"):
+        st.session_state.camera_frames = []
+        st.rerun()
+    return [CapturedFrame(frames[best][0], "image/jpeg")]
+
+def render_analysis(nutritional_values, pcos_data):
+    """Display nutrition and PCOS analysis results"""
+    if any(nutritional_values.values()):  # 确保至少有一个非零值
+        st.write("### Nutritional Analysis")
+        chart_html = nutrition_bar_chart(nutritional_values)
+        components.html(chart_html, height=200, scrolling=False)
+    else:
+        st.warning("Could not determine nutritional values. Please try again.")
+
+    # Display PCOS analysis
+    st.write("### PCOS Analysis")
+    st.markdown(f"**PCOS Score:** {pcos_data['pcos_score']}")
+
+    # Display Focus Areas
+    st.write("#### Focus Areas")
+    for area, data in pcos_data['focus_areas'].items():
+        col1, col2 = st.columns([3, 7])
+        with col1:
+            st.write(f"**{area}:**")
+        with col2:
+            # Create a progress bar
+            progress_html = f"""
+            <div style="background-color: #f0f2f6; border-radius: 10px; height: 20px; width: 100%">
+                <div style="background-color: #1f77b4; width: {data['score']*20}%; height: 100%; border-radius: 10px">
+                </div>
+            </div>
+            <p style="color: #666666; font-size: 14px; margin-top: 5px">{data['explanation']}</p>
+            """
+            st.markdown(progress_html, unsafe_allow_html=True)
+
+    # Display Actionable Suggestions
+    st.write("#### Actionable Suggestions")
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.markdown("""
+        <div style="background-color: #f8f9fa; padding: 10px; border-radius: 10px">
+            <p style="color: #1f77b4; font-weight: bold">⚡ Quick Fix</p>
+            <p style="font-size: 14px">{}</p>
+        </div>
+        """.format(pcos_data['suggestions'].get('quick_fix', '')), unsafe_allow_html=True)
+
+    with col2:
+        st.markdown("""
+        <div style="background-color: #f8f9fa; padding: 10px; border-radius: 10px">
+            <p style="color: #1f77b4; font-weight: bold">🔄 Swap Out</p>
+            <p style="font-size: 14px">{}</p>
+        </div>
+        """.format(pcos_data['suggestions'].get('swap_out', '')), unsafe_allow_html=True)
+
+    with col3:
+        st.markdown("""
+        <div style="background-color: #f8f9fa; padding: 10px; border-radius: 10px">
+            <p style="color: #1f77b4; font-weight: bold">⭐ Pro Moves</p>
+            <p style="font-size: 14px">{}</p>
+        </div>
+        """.format(pcos_data['suggestions'].get('pro_moves', '')), unsafe_allow_html=True)
+
+@st.fragment(run_every=1.0)
+def job_progress(*job_ids):
+    """Poll running background jobs and rerun the page once they have all finished"""
+    queue = get_job_queue()
+    jobs = [job for job in map(queue.get, job_ids) if job is not None]
+    if not jobs:
+        return
+    running = [job for job in jobs if not job.is_finished]
+    if not running:
+        st.rerun()
+
+    job = running[0]
+    progress = job.progress
+    if len(jobs) > 1:
+        progress += f" {len(jobs) - len(running)} of {len(jobs)} photos done."
+    wait_estimate = max(queue.wait_estimate(running_job) or 0 for running_job in running)
+    if wait_estimate:
+        st.info(f"⏳ {progress} Busy right now, about {wait_estimate:.0f}s wait ({job.elapsed():.0f}s)")
+    else:
+        st.info(f"⏳ {progress} ({job.elapsed():.0f}s)")
+    if job.kind == "analysis":
+        st.caption("You can keep browsing, finished analyses also show up in the Meal Log.")
+
+def run_detection(image_content, progress=None):
+    """Food detection as a background job"""
+    if progress:
+        progress("Detecting food items...")
+    return get_pipeline().detect_food_items(image_content)
+
+def current_detection_jobs(image_contents):
+    """Return one detection job per uploaded photo, submitting any that are missing
+
+    The photos are detected concurrently by the job queue's workers.
     """
-    return get_gemini_response("Food Detection", image_content, detection_prompt)
+    queue = get_job_queue()
+    job_ids = st.session_state.get('detection_job_ids') or {}
+    jobs = []
+    for index, image_content in enumerate(image_contents):
+        job = queue.get(job_ids[index]) if index in job_ids else None
+        if job is None or job.status == CANCELLED:
+            job_ids[index] = queue.submit(
+                session_id(st.session_state),
+                "detection",
+                run_detection,
+                image_content,
+                cancel_token=new_cancel_token(st.session_state, "detection")
+            )
+            job = queue.get(job_ids[index])
+        jobs.append(job)
+    st.session_state.detection_job_ids = job_ids
+    return jobs
+
+def merge_detections(responses):
+    """Combine the item lists detected in each photo, dropping repeated lines"""
+    seen = set()
+    items = []
+    for response in responses:
+        for line in response.split('\n'):
+            item = line.strip('• ').strip()
+            if item and item.lower() not in seen:
+                seen.add(item.lower())
+                items.append(item)
+    return "\n".join(f"• {item}" for item in items)
+
+def apply_detection(detected_items, source):
+    """Fill the food item editor from a detection result"""
+    meal_type = get_meal_type(datetime.now())
+    formatted_output, meal_name = format_meal_output(detected_items, meal_type)
+
+    st.session_state.original_detection = formatted_output
+    st.session_state.meal_name = meal_name
+    st.session_state.detection_complete = True
+    st.session_state.edited_food_items = formatted_output
+    st.session_state.detection_source = source
+    return formatted_output, meal_type
+
+def show_analysis_job():
+    """Show progress or results of this session's current analysis job"""
+    job_id = st.session_state.get('analysis_job_id')
+    job = get_job_queue().get(job_id) if job_id else None
+    if job is None:
+        return
+
+    if not job.is_finished:
+        job_progress(job.id)
+    elif job.status == CANCELLED:
+        return
+    elif job.status == FAILED:
+        st.error(f"Error during analysis: {job.error}")
+        job.delivered = True
+    else:
+        nutritional_values = job.result['nutritional_values']
+        pcos_data = job.result['pcos_analysis']
+        # 保存有效的营养分析结果
+        st.session_state['nutritional_values'] = nutritional_values if any(nutritional_values.values()) else {}
+        st.session_state['pcos_analysis'] = pcos_data
+        job.delivered = True
+        render_analysis(nutritional_values, pcos_data)
+
+def image_to_png_bytes(uploaded_files):
+    """Re-encode the uploaded images as PNG bytes, side by side when there are several"""
+    image_bytes = io.BytesIO()
+    images = [Image.open(uploaded_file) for uploaded_file in uploaded_files]
+    if len(images) == 1:
+        image = images[0]
+    else:
+        height = min(img.height for img in images)
+        images = [img.convert('RGB').resize((round(img.width * height / img.height), height)) for img in images]
+        image = Image.new('RGB', (sum(img.width for img in images), height), 'white')
+        x = 0
+        for img in images:
+            image.paste(img, (x, 0))
+            x += img.width
+    image.save(image_bytes, format='PNG')
+    return image_bytes.getvalue()
 
 def main():
     st.set_page_config(page_title="Food-Recognition", page_icon="🥗", layout="wide")
@@ -347,176 +440,170 @@ def main():
     
     # Initialize session state
     init_session_state()
+    release_job_images(st.session_state)
     
     st.header("Meal Recommendation")
 
-    uploaded_file = st.file_uploader("Upload Photo", type=["jpg", "jpeg", "png"], key="upload_photo")
+    photo_source = st.radio("Photo source", ["Upload", "Camera"], horizontal=True, key="photo_source")
+    if photo_source == "Camera":
+        uploaded_files = camera_capture()
+    else:
+        # One photo per dish, all of them make up the meal
+        uploaded_files = st.file_uploader(
+            "Upload Photos", type=["jpg", "jpeg", "png"], accept_multiple_files=True, key="upload_photo"
+        )
     
-    if handle_image_upload(uploaded_file):
-        image = Image.open(uploaded_file)
-        st.image(image, caption="Uploaded Image.", use_column_width=True)
+    if handle_image_upload(uploaded_files):
+        uploaded_images = st.session_state.uploaded_images
+        for col, uploaded_image in zip(st.columns(len(uploaded_images)), uploaded_images):
+            with col:
+                caption = "Uploaded Image." if len(uploaded_images) == 1 else None
+                st.markdown(image_html(uploaded_image, caption), unsafe_allow_html=True)
         st.success("Image uploaded successfully! Analyzing the image...")
 
         try:
-            image_content = input_image_setup(uploaded_file)
+            image_contents = [input_image_setup(uploaded_file) for uploaded_file in uploaded_files]
+            # Every photo, for the stages that still need to look at the meal
+            image_content = [part for content in image_contents for part in content]
             
-            if not st.session_state.detection_complete:
-                detected_items_response = detect_food_items(image_content)
-                current_time = datetime.now()
-                meal_type = get_meal_type(current_time)
-                formatted_output, meal_name = format_meal_output(detected_items_response, meal_type)
-                
-                st.session_state.original_detection = formatted_output
-                st.session_state.meal_name = meal_name
-                st.session_state.detection_complete = True
-                st.session_state.edited_food_items = formatted_output
-
-            st.subheader("Detected Food Items")
-            current_items = st.session_state.edited_food_items or st.session_state.original_detection
+            # An on-device guess is shown first and replaced once Gemini answers
+            refining = st.session_state.get('detection_source') == "local"
+            if not st.session_state.detection_complete or refining:
+                detection_jobs = current_detection_jobs(image_contents)
+                failed_jobs = [job for job in detection_jobs if job.status == FAILED]
+                if all(job.status == DONE for job in detection_jobs):
+                    if refining and st.session_state.edited_food_items != st.session_state.original_detection:
+                        # The user already corrected the quick guess, keep their version
+                        st.session_state.detection_source = "edited"
+                    else:
+                        formatted_output, meal_type = apply_detection(
+                            merge_detections(job.result for job in detection_jobs), "model"
+                        )
+
+                        # Get a head start on the recommendation while the user reviews the items
+                        start_speculation(
+                            st.session_state,
+                            get_pipeline().analyze_meal,
+                            formatted_output,
+                            image_content,
+                            meal_type,
+                            symptoms=st.session_state.get('selected_symptoms', []),
+                            dietary_preference=st.session_state.get('dietary_preference', '')
+                        )
+                elif failed_jobs:
+                    if refining:
+                        st.warning(f"Could not refine the detected items, keeping the quick guess: {failed_jobs[0].error}")
+                        st.session_state.detection_source = "local_only"
+                    else:
+                        st.error(f"Error during image analysis: {failed_jobs[0].error}")
+                        # Let the next rerun try the failed photos again
+                        for index, job in enumerate(detection_jobs):
+                            if job.status == FAILED:
+                                st.session_state.detection_job_ids.pop(index, None)
+                else:
+                    # Still running, or finished just now and the poller will rerun the page
+                    if st.session_state.get('detection_source') is None:
+                        local_items = [items for items in map(local_detect, image_contents) if items]
+                        if local_items:
+                            apply_detection(merge_detections(local_items), "local")
+                        else:
+                            st.session_state.detection_source = "pending"
+                    job_progress(*(job.id for job in detection_jobs))
+
+            if st.session_state.detection_complete:
+                st.subheader("Detected Food Items")
+                if st.session_state.get('detection_source') == "local":
+                    st.caption("Quick on-device guess, Gemini is still refining it.")
+                current_items = st.session_state.edited_food_items or st.session_state.original_detection
             
-            edited_items = st.text_area(
-                "Edit Food Items:",
-                value=current_items,
-                height=150,
-                key="food_items_editor"
-            )
+                edited_items = st.text_area(
+                    "Edit Food Items:",
+                    value=current_items,
+                    height=150,
+                    key="food_items_editor"
+                )
             
-            if st.button("Save Changes", key="save_food_items"):
-                st.session_state.edited_food_items = edited_items
-                st.success("Changes saved successfully!")
+                if st.button("Save Changes", key="save_food_items"):
+                    st.session_state.edited_food_items = edited_items
+                    st.success("Changes saved successfully!")
             
-            st.write("### Current Food Items")
-            st.write(st.session_state.edited_food_items or st.session_state.original_detection)
-
-            if st.button("Provide Recommendation", key="provide_recommendation"):
-                current_food_items = st.session_state.edited_food_items or st.session_state.original_detection
-                
-                # 把整体分析过程放在外层 try-except 中
-                try:
-                    # Nutrition Analysis
-                    nutrition_prompt = textwrap.dedent(f"""
-                        Provide a nutritional analysis for the following dish:
-                        {current_food_items}
-                        Just simply display(no extra wordings) the nutritional values as percentages for protein, fat, carbs, and fiber.
-                        Format your response like this:
-                        Protein: X%
-                        Fat: Y%
-                        Carbs: Z%
-                        Fiber: W%
-                        Where X, Y, Z, and W are numeric values.
-                        """)
-
-                    # 单独处理营养分析的异常
-                    nutrition_response = get_gemini_response("Nutrition Analysis", image_content, nutrition_prompt)
-                    nutritional_values = parse_nutritional_values(nutrition_response)
-                    
-                    if any(nutritional_values.values()):  # 确保至少有一个非零值
-                        st.write("### Nutritional Analysis")
-                        chart_html = nutrition_bar_chart(nutritional_values)
-                        components.html(chart_html, height=200, scrolling=False)
-                        # 保存有效的营养分析结果
-                        st.session_state['nutritional_values'] = nutritional_values
-                    else:
-                        st.warning("Could not determine nutritional values. Please try again.")
-                        st.session_state['nutritional_values'] = {}
+                st.write("### Current Food Items")
+                st.write(st.session_state.edited_food_items or st.session_state.original_detection)
 
-                    # PCOS Analysis - 不需要嵌套在内层 try-except 中
+                if st.button("Provide Recommendation", key="provide_recommendation"):
+                    current_food_items = st.session_state.edited_food_items or st.session_state.original_detection
                     current_time = datetime.now()
                     meal_type = get_meal_type(current_time)
-                    pcos_response = get_pcos_analysis(current_food_items, image_content, meal_type)
-                    pcos_data = parse_pcos_response(pcos_response)
-
-                    # Display PCOS analysis
-                    st.write("### PCOS Analysis")
-                    st.markdown(f"**PCOS Score:** {pcos_data['pcos_score']}")
-                    
-                    # Display Focus Areas
-                    st.write("#### Focus Areas")
-                    for area, data in pcos_data['focus_areas'].items():
-                        col1, col2 = st.columns([3, 7])
-                        with col1:
-                            st.write(f"**{area}:**")
-                        with col2:
-                            # Create a progress bar
-                            progress_html = f"""
-                            <div style="background-color: #f0f2f6; border-radius: 10px; height: 20px; width: 100%">
-                                <div style="background-color: #1f77b4; width: {data['score']*20}%; height: 100%; border-radius: 10px">
-                                </div>
-                            </div>
-                            <p style="color: #666666; font-size: 14px; margin-top: 5px">{data['explanation']}</p>
-                            """
-                            st.markdown(progress_html, unsafe_allow_html=True)
-
-                    # Display Actionable Suggestions
-                    st.write("#### Actionable Suggestions")
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.markdown("""
-                        <div style="background-color: #f8f9fa; padding: 10px; border-radius: 10px">
-                            <p style="color: #1f77b4; font-weight: bold">⚡ Quick Fix</p>
-                            <p style="font-size: 14px">{}</p>
-                        </div>
-                        """.format(pcos_data['suggestions'].get('quick_fix', '')), unsafe_allow_html=True)
-                    
-                    with col2:
-                        st.markdown("""
-                        <div style="background-color: #f8f9fa; padding: 10px; border-radius: 10px">
-                            <p style="color: #1f77b4; font-weight: bold">🔄 Swap Out</p>
-                            <p style="font-size: 14px">{}</p>
-                        </div>
-                        """.format(pcos_data['suggestions'].get('swap_out', '')), unsafe_allow_html=True)
-                    
-                    with col3:
-                        st.markdown("""
-                        <div style="background-color: #f8f9fa; padding: 10px; border-radius: 10px">
-                            <p style="color: #1f77b4; font-weight: bold">⭐ Pro Moves</p>
-                            <p style="font-size: 14px">{}</p>
-                        </div>
-                        """.format(pcos_data['suggestions'].get('pro_moves', '')), unsafe_allow_html=True)
-
-                    # Save analysis results
-                    st.session_state['pcos_analysis'] = pcos_data
-
-                except Exception as e:
-                    st.error(f"Error during analysis: {str(e)}")
+
+                    symptoms = st.session_state.get('selected_symptoms', [])
+                    dietary_preference = st.session_state.get('dietary_preference', '')
+                    meta = {
+                        "meal_type": meal_type,
+                        "meal_name": st.session_state.get('meal_name', 'Unknown Meal'),
+                        "food_items": current_food_items,
+                        "time": current_time.strftime("%I:%M %p"),
+                        "date": current_time.strftime("%Y-%m-%d"),
+                        "image": session_images(st.session_state).store(
+                            "pending_analysis", image_to_png_bytes(uploaded_files)
+                        ),
+                    }
+
+                    # Use the speculative analysis if the items weren't edited since detection
+                    st.session_state.analysis_job_id = claim_speculation(
+                        st.session_state, current_food_items, meal_type,
+                        symptoms=symptoms, dietary_preference=dietary_preference, meta=meta
+                    )
+                    if st.session_state.analysis_job_id is None:
+                        # Run the analysis in the background so navigating away doesn't lose it
+                        st.session_state.analysis_job_id = get_job_queue().submit(
+                            session_id(st.session_state),
+                            "analysis",
+                            get_pipeline().analyze_meal,
+                            current_food_items,
+                            image_content,
+                            meal_type,
+                            symptoms=symptoms,
+                            dietary_preference=dietary_preference,
+                            cancel_token=new_cancel_token(st.session_state, "analysis"),
+                            meta=meta
+                        )
+                    # The photo stays until the result is shown, logged or dismissed
+                    session_images(st.session_state).move(
+                        "pending_analysis", job_image_key(st.session_state.analysis_job_id)
+                    )
+
+                show_analysis_job()
 
         except Exception as e:
             st.error(f"Error during image analysis: {e}")
 
     # Log Activity button
     if st.button("Log Activity", key="log_activity"):
-        if 'edited_food_items' in st.session_state and uploaded_file:
+        if 'edited_food_items' in st.session_state and uploaded_files:
             try:
-                image_bytes = io.BytesIO()
-                image = Image.open(uploaded_file)
-                image.save(image_bytes, format='PNG')
-                
                 current_time = datetime.now()
                 meal_type = get_meal_type(current_time)
                 
                 # Create meal log entry
-                new_meal = {
-                    "meal_type": meal_type,
-                    "name": st.session_state.get('meal_name', 'Unknown Meal'),
-                    "details": st.session_state.edited_food_items,
-                    "time": current_time.strftime("%I:%M %p"),
-                    "date": current_time.strftime("%Y-%m-%d"),
-                    "image": image_bytes.getvalue(),
-                    "nutrition_analysis": {
-                        "values": st.session_state.get('nutritional_values', {}),
-                    },
-                    "pcos_analysis": {
-                        "score": st.session_state.get('pcos_analysis', {}).get('pcos_score', ''),
-                        "focus_areas": st.session_state.get('pcos_analysis', {}).get('focus_areas', {}),
-                        "suggestions": st.session_state.get('pcos_analysis', {}).get('suggestions', {})
-                    }
-                }
-                
-                if 'meal_log' not in st.session_state:
-                    st.session_state.meal_log = []
-                
-                st.session_state.meal_log.append(new_meal)
+                new_meal = MealRecord(
+                    meal_type=meal_type,
+                    name=st.session_state.get('meal_name', 'Unknown Meal'),
+                    details=st.session_state.edited_food_items,
+                    time=current_time.strftime("%I:%M %p"),
+                    date=current_time.strftime("%Y-%m-%d"),
+                    nutritional_values=st.session_state.get('nutritional_values'),
+                    pcos_analysis=st.session_state.get('pcos_analysis'),
+                )
+
+                get_meal_log(st.session_state).append(new_meal)
+                new_meal.image = session_images(st.session_state).store(
+                    f"meal:{new_meal.id}", image_to_png_bytes(uploaded_files)
+                )
+                index_meal(st.session_state, new_meal)
+                # Logged without asking for a recommendation, the speculative analysis went unused
+                drop_speculation(st.session_state)
+                # Spill older images to disk if this session is over its memory budget
+                enforce_budget(st.session_state)
                 st.success("Activity logged successfully!")
                 st.switch_page("pages/3_Meal_Log.py")
             except Exception as e:
@@ -528,4 +615,5 @@ def main():
     navigation()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_rerun(st.session_state, st.query_params, "app"):
+        main()
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""Offline accuracy/latency benchmark for the on-box food classifier
+
+Samples are laid out one folder per label, the folder name being the expected
+food item; a "grams.csv" next to the images (file,grams) adds portion error:
+
+    samples/
+        pizza/ 001.jpg 002.jpg grams.csv
+        caesar_salad/ 001.jpg
+
+Run with:
+    python benchmark_classifier.py samples --model food101_int8.onnx --labels food101_labels.txt
+    python benchmark_classifier.py samples --compare-remote   # also time Gemini detection
+"""
+import argparse
+import csv
+import os
+import statistics
+import time
+
+import local_classifier
+from item_cache import normalize_item_name, parse_food_items
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def load_samples(root):
+    """Return [(path, label, grams or None)] from a folder-per-label sample set"""
+    samples = []
+    for folder in sorted(os.listdir(root)):
+        folder_path = os.path.join(root, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        grams = {}
+        grams_path = os.path.join(folder_path, "grams.csv")
+        if os.path.exists(grams_path):
+            with open(grams_path, newline="") as f:
+                grams = {row[0]: float(row[1]) for row in csv.reader(f) if len(row) >= 2}
+        label = normalize_item_name(folder.replace("_", " "))
+        for name in sorted(os.listdir(folder_path)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                samples.append((os.path.join(folder_path, name), label, grams.get(name)))
+    return samples
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def matches(label, names):
+    """Whether the expected label is one of the predicted item names"""
+    # Whole normalized names only, a "cake" guess is no hit for "carrot cake"
+    return label in names
+
+
+def benchmark_local(classifier, samples, top_k, warmup):
+    for path, _, _ in samples[:warmup]:
+        with open(path, "rb") as f:
+            classifier.predict(f.read(), top_k)
+
+    latencies, top1, topk, portion_errors = [], 0, 0, []
+    for path, label, grams in samples:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        start = time.perf_counter()
+        guesses = classifier.predict(image_bytes, top_k)
+        latencies.append(time.perf_counter() - start)
+
+        names = [normalize_item_name(guess[0]) for guess in guesses]
+        top1 += matches(label, names[:1])
+        topk += matches(label, names)
+        if grams is not None and names and matches(label, names[:1]):
+            portion_errors.append(abs(guesses[0][2] - grams))
+    return latencies, top1, topk, portion_errors
+
+
+def benchmark_remote(samples):
+    import analysis
+
+    latencies, hits, failures = [], 0, 0
+    for path, label, _ in samples:
+        with open(path, "rb") as f:
+            image_content = [{"mime_type": "image/png" if path.endswith(".png") else "image/jpeg", "data": f.read()}]
+        start = time.perf_counter()
+        try:
+            response = analysis.detect_food_items(image_content)
+        except Exception:
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        hits += matches(label, [item.name for item in parse_food_items(response)])
+    return latencies, hits, failures
+
+
+def print_latency(title, latencies):
+    print(f"{title} latency p50: {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p95: {percentile(latencies, 95) * 1000:.1f} ms, "
+          f"mean: {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", help="folder-per-label sample directory")
+    parser.add_argument("--model", default=local_classifier.MODEL_PATH, help="ONNX model path")
+    parser.add_argument("--labels", default=local_classifier.LABELS_PATH, help="labels file path")
+    parser.add_argument("--top-k", type=int, default=local_classifier.TOP_K)
+    parser.add_argument("--threads", type=int, default=local_classifier.THREADS)
+    parser.add_argument("--warmup", type=int, default=5, help="untimed runs before measuring")
+    parser.add_argument("--compare-remote", action="store_true", help="also run Gemini detection on every sample")
+    args = parser.parse_args()
+
+    if local_classifier.ort is None:
+        parser.error("onnxruntime is not installed")
+    if not args.model or not args.labels:
+        parser.error("--model and --labels (or LOCAL_CLASSIFIER_MODEL/LOCAL_CLASSIFIER_LABELS) are required")
+
+    samples = load_samples(args.samples)
+    if not samples:
+        parser.error(f"no labeled images found under {args.samples}")
+
+    start = time.perf_counter()
+    classifier = local_classifier.LocalClassifier(
+        args.model, local_classifier.load_labels(args.labels), threads=args.threads
+    )
+    load_time = time.perf_counter() - start
+
+    latencies, top1, topk, portion_errors = benchmark_local(classifier, samples, args.top_k, args.warmup)
+    print(f"Samples:             {len(samples)} in {len({label for _, label, _ in samples})} classes")
+    print(f"Model load:          {load_time * 1000:.0f} ms")
+    print(f"Top-1 accuracy:      {top1 / len(samples):.1%}")
+    print(f"Top-{args.top_k} accuracy:      {topk / len(samples):.1%}")
+    if portion_errors:
+        print(f"Portion MAE:         {statistics.mean(portion_errors):.0f} g over {len(portion_errors)} samples")
+    print_latency("Local", latencies)
+
+    if args.compare_remote:
+        remote_latencies, hits, failures = benchmark_remote(samples)
+        print(f"Remote detection hit rate: {hits / len(samples):.1%} ({failures} failed calls)")
+        if remote_latencies:
+            print_latency("Remote", remote_latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import contextvars
+import threading
+import weakref
+from contextlib import contextmanager
+
+SCOPE_KEY = "_cancel_scope"
+
+# Why work gets cancelled
+SUPERSEDED = "superseded"
+NAVIGATION = "navigation"
+SESSION_END = "session_end"
+DISCARDED = "discarded"
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """Cooperative cancellation flag for analysis work tied to one upload"""
+
+    def __init__(self, session_id, file_key, kind):
+        self.session_id = session_id
+        self.file_key = file_key
+        self.kind = kind
+        self.reason = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+            return True
+        return False
+
+    def check(self):
+        """Raise AnalysisCancelled if this work is no longer wanted"""
+        if self._event.is_set():
+            raise AnalysisCancelled(f"{self.kind} cancelled ({self.reason})")
+
+
+class CancellationRegistry:
+    """Process-wide registry of in-flight work, with cancellation counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = set()
+        self._counts = {}
+
+    def token(self, session_id, file_key, kind):
+        token = CancelToken(session_id, file_key, kind)
+        with self._lock:
+            self._tokens.add(token)
+        return token
+
+    def release(self, token):
+        """Forget a token once its work has finished"""
+        with self._lock:
+            self._tokens.discard(token)
+
+    def cancel(self, session_id, reason, kind=None, keep_file_key=None):
+        """Cancel a session's work, optionally only one kind or everything but the current upload"""
+        with self._lock:
+            matching = [
+                token for token in self._tokens
+                if token.session_id == session_id
+                and (kind is None or token.kind == kind)
+                and (keep_file_key is None or token.file_key != keep_file_key)
+            ]
+            cancelled = 0
+            for token in matching:
+                if token.cancel(reason):
+                    cancelled += 1
+                    key = (reason, token.kind)
+                    self._counts[key] = self._counts.get(key, 0) + 1
+                self._tokens.discard(token)
+        return cancelled
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._tokens),
+                "cancelled": {f"{kind}/{reason}": count for (reason, kind), count in self._counts.items()},
+            }
+
+
+registry = CancellationRegistry()
+
+_current_token = contextvars.ContextVar("cancel_token", default=None)
+
+
+@contextmanager
+def active_token(token):
+    """Make token the one check_cancelled() looks at for the duration of a job"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check_cancelled():
+    """Cancellation point for whatever job is running on this thread"""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+
+class SessionCancelScope:
+    """Lives in session state and cancels the session's work when the session goes away"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self._finalizer = weakref.finalize(self, registry.cancel, session_id, SESSION_END)
+
+
+def session_scope(session_state, session_id):
+    if SCOPE_KEY not in session_state:
+        session_state[SCOPE_KEY] = SessionCancelScope(session_id)
+    return session_state[SCOPE_KEY]
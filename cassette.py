@@ -0,0 +1,192 @@
+"""Record model traffic to a cassette file and replay it offline
+
+    CASSETTE_MODE=record streamlit run app.py    # real calls, responses appended to the cassette
+    CASSETTE_MODE=replay streamlit run app.py    # no network, no API key, same answers every run
+
+CASSETTE_PATH picks the file (default cassettes/default.jsonl). With
+CASSETTE_MATCH=text image bytes are left out of the request fingerprint, so a
+recorded session replays for any photo. CASSETTE_LATENCY is "0" (default),
+"recorded" or a fixed number of milliseconds per call.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from request_planner import estimate_tokens
+from stub_backend import StubUsage, StubTokenCount
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CASSETTE_PATH = os.getenv("CASSETTE_PATH") or os.path.join(ROOT, "cassettes", "default.jsonl")
+CASSETTE_MATCH = os.getenv("CASSETTE_MATCH", "exact")
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "0")
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+def fingerprint(contents, generation_config=None, match="exact"):
+    """Stable hash of a request; the model name is left out so routing changes still replay"""
+    digest = hashlib.sha256()
+    for part in contents:
+        if isinstance(part, str):
+            digest.update(part.encode("utf-8"))
+        else:
+            digest.update(part.get("mime_type", "").encode())
+            if match == "exact":
+                digest.update(hashlib.sha256(part["data"]).digest())
+        digest.update(b"\0")
+    digest.update(json.dumps(generation_config or {}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ReplayResponse:
+    def __init__(self, text, prompt_token_count, candidates_token_count):
+        self.text = text
+        self.usage_metadata = StubUsage(prompt_token_count, candidates_token_count)
+
+
+class Cassette:
+    """Recorded responses keyed by request fingerprint, served back in recorded order"""
+
+    def __init__(self, path=CASSETTE_PATH, match=CASSETTE_MATCH, latency=CASSETTE_LATENCY):
+        self.path = path
+        self.match = match
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._entries = None
+        self._served = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    def _load_locked(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(self._key(entry), []).append(entry)
+
+    def _key(self, entry):
+        return entry["fingerprint"] if self.match == "exact" else entry["text_fingerprint"]
+
+    def record(self, model_name, contents, generation_config, response, latency_s):
+        usage = getattr(response, "usage_metadata", None)
+        # Both fingerprints are kept so one recording serves either match mode
+        entry = {
+            "fingerprint": fingerprint(contents, generation_config, "exact"),
+            "text_fingerprint": fingerprint(contents, generation_config, "text"),
+            "stage": contents[0] if contents and isinstance(contents[0], str) else "",
+            "model": model_name,
+            "text": response.text,
+            "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+            "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+            "latency_ms": round(latency_s * 1000),
+        }
+        with self._lock:
+            self._load_locked()
+            self._entries.setdefault(self._key(entry), []).append(entry)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.recorded += 1
+
+    def replay(self, key, stage):
+        """Next recorded entry for this fingerprint, repeating the last one once all were served"""
+        with self._lock:
+            self._load_locked()
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response for {stage or 'request'} {key[:12]} in {self.path}")
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            self.hits += 1
+            return entries[min(index, len(entries) - 1)]
+
+    def replay_delay(self, entry):
+        if self.latency == "recorded":
+            return entry["latency_ms"] / 1000
+        return float(self.latency or 0) / 1000
+
+    def stats(self):
+        with self._lock:
+            self._load_locked()
+            return {
+                "path": self.path,
+                "requests": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "recorded": self.recorded,
+            }
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette()
+        return _cassette
+
+
+def configure(path=None, match=None, latency=None):
+    """Swap in a cassette with different settings, e.g. from the load test"""
+    global _cassette
+    with _cassette_lock:
+        _cassette = Cassette(
+            path or CASSETTE_PATH,
+            match or CASSETTE_MATCH,
+            CASSETTE_LATENCY if latency is None else latency
+        )
+        return _cassette
+
+
+class RecordingModel:
+    """Wraps a real model and appends every successful response to the cassette"""
+
+    def __init__(self, model, model_name):
+        self.model = model
+        self.model_name = model_name
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        cassette = get_cassette()
+        start = time.monotonic()
+        response = self.model.generate_content(contents, generation_config=generation_config, **kwargs)
+        cassette.record(self.model_name, contents, generation_config, response, time.monotonic() - start)
+        return response
+
+    def count_tokens(self, contents):
+        return self.model.count_tokens(contents)
+
+
+class ReplayModel:
+    """Answers from the cassette only, never touches the network"""
+
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        cassette = get_cassette()
+        stage = contents[0] if contents and isinstance(contents[0], str) else ""
+        entry = cassette.replay(fingerprint(contents, generation_config, cassette.match), stage)
+        delay = cassette.replay_delay(entry)
+        if delay > 0:
+            time.sleep(delay)
+        return ReplayResponse(entry["text"], entry["prompt_tokens"], entry["output_tokens"])
+
+    def count_tokens(self, contents):
+        return StubTokenCount(estimate_tokens(contents))
+
+
+def stats():
+    return get_cassette().stats()
@@ -0,0 +1,47 @@
+import hashlib
+
+from meal_records import NUTRIENTS
+
+CACHE_KEY = "_daily_digests"
+
+
+def day_meals(meal_log, date):
+    """The day's meals in the order they were logged"""
+    return [meal for meal in meal_log if meal.date == date]
+
+
+def day_fingerprint(meals, symptoms=None, dietary_preference=''):
+    """Changes whenever anything the digest prompt sees for the day changes"""
+    digest = hashlib.sha256()
+    parts = [dietary_preference or '', *sorted(symptoms or [])]
+    for meal in meals:
+        parts += [meal.id, meal.meal_type, meal.time, meal.details, meal.pcos_score]
+        parts += [str(getattr(meal, nutrient)) for nutrient in NUTRIENTS]
+    for part in parts:
+        digest.update((part or '').encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cached_digest(session_state, date, meals, symptoms=None, dietary_preference=''):
+    """The day's digest if one was made for exactly these meals, else None"""
+    entry = session_state.get(CACHE_KEY, {}).get(date)
+    if entry and entry[0] == day_fingerprint(meals, symptoms, dietary_preference):
+        return entry[1]
+    return None
+
+
+def daily_digest(session_state, date, meals, fetch, parse, symptoms=None, dietary_preference=''):
+    """Digest for a day, calling fetch once for all its meals only when they changed since the last one"""
+    digest = cached_digest(session_state, date, meals, symptoms, dietary_preference)
+    if digest is not None:
+        return digest
+    digest = parse(fetch(meals, symptoms, dietary_preference), len(meals))
+    # Deltas are stored by meal id so they still line up if the day is re-rendered in another order
+    digest['meal_deltas'] = {
+        meals[position].id: delta for position, delta in digest['meal_deltas'].items()
+    }
+    session_state.setdefault(CACHE_KEY, {})[date] = (
+        day_fingerprint(meals, symptoms, dietary_preference), digest
+    )
+    return digest
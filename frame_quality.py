@@ -0,0 +1,91 @@
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+# Frames are scored at this size so thresholds don't depend on the camera resolution
+ANALYSIS_SIZE = 512
+# Variance of the Laplacian below this is too blurry to recognise food in
+MIN_SHARPNESS = float(os.getenv("FRAME_MIN_SHARPNESS", "40"))
+# Mean brightness on a 0-255 scale
+MIN_BRIGHTNESS = float(os.getenv("FRAME_MIN_BRIGHTNESS", "45"))
+MAX_BRIGHTNESS = float(os.getenv("FRAME_MAX_BRIGHTNESS", "215"))
+# Share of pixels that are crushed to black or blown out to white
+MAX_CLIPPED = float(os.getenv("FRAME_MAX_CLIPPED", "0.25"))
+# How many recent shots the best frame is picked from
+BURST_SIZE = int(os.getenv("CAMERA_BURST_SIZE", "3"))
+
+
+class FrameQuality:
+    """Local sharpness and exposure measurements for one camera frame"""
+    __slots__ = ('sharpness', 'brightness', 'clipped', 'problems', 'elapsed_ms')
+
+    def __init__(self, sharpness, brightness, clipped, problems, elapsed_ms):
+        self.sharpness = sharpness
+        self.brightness = brightness
+        self.clipped = clipped
+        self.problems = problems
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def usable(self):
+        return not self.problems
+
+    @property
+    def score(self):
+        """Ranking within a burst: sharper is better, badly exposed frames lose ground"""
+        exposure = 1.0 - min(1.0, abs(self.brightness - 128) / 128) * 0.5 - self.clipped
+        return self.sharpness * max(exposure, 0.1)
+
+
+class CapturedFrame(io.BytesIO):
+    """Camera frame bytes that pass for an uploaded file"""
+
+    def __init__(self, data, mime_type="image/jpeg"):
+        super().__init__(data)
+        self.name = "camera.jpg"
+        self.type = mime_type
+
+
+def laplacian_variance(gray):
+    """Variance of the 4-neighbour Laplacian, the usual focus measure"""
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+def assess_frame(image_bytes):
+    """Score a frame's sharpness and exposure without any model call"""
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    # Let the JPEG decoder skip most of the pixels
+    image.draft("L", (ANALYSIS_SIZE, ANALYSIS_SIZE))
+    image = image.convert("L")
+    image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    gray = np.asarray(image, dtype=np.float32)
+
+    sharpness = laplacian_variance(gray)
+    brightness = float(gray.mean())
+    clipped = float(np.count_nonzero((gray <= 5) | (gray >= 250)) / gray.size)
+
+    problems = []
+    if sharpness < MIN_SHARPNESS:
+        problems.append("too blurry, hold the camera still")
+    if brightness < MIN_BRIGHTNESS:
+        problems.append("too dark, add some light")
+    elif brightness > MAX_BRIGHTNESS:
+        problems.append("too bright, avoid direct light")
+    if clipped > MAX_CLIPPED:
+        problems.append("too much glare or shadow")
+    return FrameQuality(sharpness, brightness, clipped, problems, (time.perf_counter() - start) * 1000)
+
+
+def best_frame(frames):
+    """Index of the best (bytes, FrameQuality) frame, usable frames first"""
+    if not frames:
+        return None
+    return max(range(len(frames)), key=lambda i: (frames[i][1].usable, frames[i][1].score))
@@ -0,0 +1,237 @@
+import hashlib
+import html
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Streamlit serves ./static next to app.py at app/static/ when server.enableStaticServing is on
+IMAGE_DIR = os.getenv("IMAGE_STORE_DIR") or os.path.join(ROOT, "static", "meal_images")
+# Point at the analysis service's /images endpoint to serve with immutable cache headers
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "app/static/meal_images").rstrip("/")
+
+MIME_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/jpg": "jpg", "image/webp": "webp"}
+
+# Files no session refers to, e.g. left over from before a restart, are removed after this long
+ORPHAN_TTL_SECONDS = float(os.getenv("IMAGE_STORE_ORPHAN_TTL", "3600"))
+SWEEP_INTERVAL_SECONDS = 600
+
+SESSION_KEY = "_session_images"
+
+
+class StoredImage:
+    """Reference to image bytes in the content-addressed image store"""
+    __slots__ = ("digest", "ext", "size")
+
+    def __init__(self, digest, ext, size):
+        self.digest = digest
+        self.ext = ext
+        self.size = size
+
+    @property
+    def filename(self):
+        return f"{self.digest}.{self.ext}"
+
+    @property
+    def path(self):
+        return os.path.join(IMAGE_DIR, self.filename)
+
+    @property
+    def url(self):
+        # The file behind a digest never changes, the version argument lets it be cached for good
+        return f"{IMAGE_BASE_URL}/{self.filename}?v={self.digest[:16]}"
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def __repr__(self):
+        return f"StoredImage({self.filename}, {self.size} bytes)"
+
+
+# Stored filename -> number of session references, shared by every session in the process
+_refs = {}
+_refs_lock = threading.RLock()
+_last_sweep = 0.0
+
+
+def find_stored(digest):
+    """StoredImage for a digest that is already in the store, None if it isn't"""
+    for ext in sorted(set(MIME_EXTENSIONS.values())):
+        image = StoredImage(digest, ext, 0)
+        try:
+            image.size = os.path.getsize(image.path)
+        except OSError:
+            continue
+        return image
+    return None
+
+
+def store_image(image_bytes, mime_type="image/png"):
+    """Write image bytes under their sha256 unless already stored
+
+    Unreferenced files are swept, so keep the result through SessionImages.
+    """
+    image = StoredImage(
+        hashlib.sha256(image_bytes).hexdigest(),
+        MIME_EXTENSIONS.get(mime_type, "png"),
+        len(image_bytes)
+    )
+    with _refs_lock:
+        if not os.path.exists(image.path):
+            os.makedirs(IMAGE_DIR, exist_ok=True)
+            # Write then rename so a concurrent reader never sees a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=IMAGE_DIR, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(image_bytes)
+            os.replace(tmp_path, image.path)
+        else:
+            # Storing again counts as fresh, the orphan sweep goes by modification time
+            os.utime(image.path)
+    _maybe_sweep()
+    return image
+
+
+def _retain(images):
+    with _refs_lock:
+        for image in images:
+            _refs[image.filename] = _refs.get(image.filename, 0) + 1
+
+
+def _release(images):
+    """Drop references, deleting files nothing refers to any more"""
+    with _refs_lock:
+        for image in images:
+            count = _refs.get(image.filename, 0) - 1
+            if count > 0:
+                _refs[image.filename] = count
+                continue
+            _refs.pop(image.filename, None)
+            try:
+                os.remove(image.path)
+            except FileNotFoundError:
+                pass
+
+
+def _release_all(held):
+    for images in held.values():
+        _release(images)
+    held.clear()
+
+
+def sweep_orphans(max_age=ORPHAN_TTL_SECONDS):
+    """Delete stored files no session refers to that are older than max_age, returns how many"""
+    cutoff = time.time() - max_age
+    removed = 0
+    with _refs_lock:
+        try:
+            names = os.listdir(IMAGE_DIR)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if name in _refs:
+                continue
+            path = os.path.join(IMAGE_DIR, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
+
+
+def _maybe_sweep():
+    global _last_sweep
+    now = time.monotonic()
+    if now - _last_sweep < SWEEP_INTERVAL_SECONDS:
+        return
+    _last_sweep = now
+    sweep_orphans()
+
+
+class SessionImages:
+    """Stored images a session refers to, by owner key such as "meal:<id>"
+
+    A file is deleted once no session holds it, at the latest when the
+    session ends.
+    """
+
+    def __init__(self):
+        self._held = {}
+        self._finalizer = weakref.finalize(self, _release_all, self._held)
+
+    def __contains__(self, key):
+        return key in self._held
+
+    def keys(self):
+        return list(self._held)
+
+    def hold(self, key, images):
+        """Make key refer to these stored images, replacing what it held before"""
+        images = [image for image in images if isinstance(image, StoredImage)]
+        with _refs_lock:
+            # Retain first so an image held under the old and new key is never deleted in between
+            _retain(images)
+            _release(self._held.pop(key, []))
+            if images:
+                self._held[key] = images
+
+    def store(self, key, image_bytes, mime_type="image/png"):
+        """Store one image and hold it under key"""
+        return self.store_all(key, [(image_bytes, mime_type)])[0]
+
+    def store_all(self, key, images):
+        """Store (bytes, mime type) pairs and hold them all under key"""
+        with _refs_lock:
+            stored = [store_image(image_bytes, mime_type) for image_bytes, mime_type in images]
+            self.hold(key, stored)
+        return stored
+
+    def move(self, old_key, new_key):
+        with _refs_lock:
+            images = self._held.pop(old_key, [])
+            _release(self._held.pop(new_key, []))
+            if images:
+                self._held[new_key] = images
+
+    def release(self, key):
+        with _refs_lock:
+            _release(self._held.pop(key, []))
+
+    def prune(self, keep):
+        """Release every key the keep predicate rejects"""
+        for key in self.keys():
+            if not keep(key):
+                self.release(key)
+
+
+def session_images(session_state):
+    """Return the image references held by this session, creating them if needed"""
+    if SESSION_KEY not in session_state:
+        session_state[SESSION_KEY] = SessionImages()
+    return session_state[SESSION_KEY]
+
+
+def ensure_stored(image, load=None, store=store_image):
+    """Return a StoredImage for in-memory or spilled image bytes, None if there is no image"""
+    if isinstance(image, StoredImage):
+        return image
+    if load is not None:
+        image = load(image)
+    if isinstance(image, (bytes, bytearray)) and image:
+        return store(bytes(image))
+    return None
+
+
+def image_html(image, caption=None):
+    """<img> tag for a stored image, the browser fetches and caches it by URL"""
+    tag = (
+        f'<img src="{html.escape(image.url)}" loading="lazy" '
+        f'style="width: 100%; border-radius: 8px;" alt="{html.escape(caption or "Meal photo")}">'
+    )
+    if caption:
+        tag += f'<p style="color: #666666; font-size: 14px; text-align: center;">{html.escape(caption)}</p>'
+    return tag
@@ -0,0 +1,142 @@
+import os
+import re
+import textwrap
+
+from meal_records import NUTRIENTS
+from result_cache import ResultCache
+
+MEAL_TYPES = {'breakfast', 'lunch', 'dinner'}
+DEFAULT_PORTION_GRAMS = 100
+
+# Counts and serving words carry no nutrition information once the weight is known
+QUANTITY_WORDS = {
+    'a', 'an', 'one', 'two', 'three', 'four', 'five', 'six', 'half', 'quarter', 'of',
+    'slice', 'slices', 'scoop', 'scoops', 'cup', 'cups', 'piece', 'pieces', 'bowl', 'bowls',
+    'serving', 'servings', 'handful', 'tbsp', 'tsp', 'tablespoon', 'tablespoons',
+    'teaspoon', 'teaspoons', 'glass', 'glasses', 'plate', 'portion', 'small', 'medium', 'large',
+}
+WEIGHT_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(kg|g|ml|l)\b', re.IGNORECASE)
+UNIT_GRAMS = {'g': 1, 'ml': 1, 'kg': 1000, 'l': 1000}
+
+# Nutrient grams per 100 g of each normalized food item, shared by every session in the process
+item_cache = ResultCache(int(os.getenv("ITEM_CACHE_SIZE", "10000")))
+
+
+class FoodItem:
+    """One line of the food item list, reduced to a cache key and a weight"""
+    __slots__ = ('name', 'grams', 'text')
+
+    def __init__(self, name, grams, text):
+        self.name = name
+        self.grams = grams
+        self.text = text
+
+
+def normalize_item_name(text):
+    """Cache key for a food item: lowercase words without counts, servings or weights"""
+    text = text.split('(')[0].lower()
+    text = WEIGHT_PATTERN.sub(' ', text)
+    words = re.findall(r'[a-z]+', text)
+    return ' '.join(word for word in words if word not in QUANTITY_WORDS)
+
+
+def _item_lines(food_items):
+    for line in (food_items or '').split('\n'):
+        line = line.strip().lstrip('•-* ').strip()
+        if line and line.lower() not in MEAL_TYPES:
+            yield line
+
+
+def unparsed_lines(food_items):
+    """Food item lines with no name left after normalizing, e.g. non-English names"""
+    return [line for line in _item_lines(food_items) if not normalize_item_name(line)]
+
+
+def parse_food_items(food_items):
+    """Split the edited food item text into FoodItems"""
+    items = []
+    for line in _item_lines(food_items):
+        name = normalize_item_name(line)
+        if not name:
+            continue
+        match = WEIGHT_PATTERN.search(line)
+        grams = DEFAULT_PORTION_GRAMS
+        if match:
+            grams = float(match.group(1)) * UNIT_GRAMS[match.group(2).lower()]
+        items.append(FoodItem(name, grams, line))
+    return items
+
+
+def parse_item_nutrition(response_text, items):
+    """Parse 'item|protein|fat|carbs|fiber' lines, matched back to items by name, then by order"""
+    rows = []
+    for line in response_text.strip().split('\n'):
+        parts = [part.strip() for part in line.strip().lstrip('•-* ').split('|')]
+        if len(parts) != 5:
+            continue
+        try:
+            values = [max(0.0, float(re.sub(r'[^\d.]', '', part) or 0)) for part in parts[1:]]
+        except ValueError:
+            continue
+        rows.append((normalize_item_name(parts[0]), dict(zip(NUTRIENTS, values))))
+
+    by_name = {}
+    for name, values in rows:
+        by_name.setdefault(name, values)
+    matched = {item.name: by_name[item.name] for item in items if item.name in by_name}
+    if len(rows) == len(items):
+        # A row whose name matches no item was probably reworded, trust its position
+        item_names = {item.name for item in items}
+        for item, (name, values) in zip(items, rows):
+            if item.name not in matched and name not in item_names:
+                matched[item.name] = values
+    return matched
+
+
+def item_nutrition_prompt(items):
+    lines = "\n".join(item.name for item in items)
+    return textwrap.dedent("""
+        For each food item below give grams of protein, fat, carbs and fiber per 100 g.
+        Answer with exactly one line per item, in the same order, with no extra wording:
+        item|protein|fat|carbs|fiber
+        Food Items:
+        """) + lines
+
+
+def compose_nutrition(items, per_100g):
+    """Meal macro shares in percent, composed from cached per-item values"""
+    totals = dict.fromkeys(NUTRIENTS, 0.0)
+    for item in items:
+        values = per_100g.get(item.name)
+        if values is None:
+            continue
+        for nutrient in NUTRIENTS:
+            totals[nutrient] += values[nutrient] * item.grams / 100
+    total = sum(totals.values())
+    if total <= 0:
+        return dict.fromkeys(NUTRIENTS, 0)
+    return {nutrient: round(totals[nutrient] / total * 100) for nutrient in NUTRIENTS}
+
+
+def lookup_items(items, fetch):
+    """Per-100g values for every item, calling fetch only for items not cached yet"""
+    per_100g = {}
+    missing = []
+    for item in items:
+        values = item_cache.get(item.name)
+        if values is None:
+            if item.name not in (m.name for m in missing):
+                missing.append(item)
+        else:
+            per_100g[item.name] = values
+
+    if missing:
+        fetched = fetch(missing)
+        for name, values in fetched.items():
+            item_cache.put(name, values)
+        per_100g.update(fetched)
+    return per_100g, missing
+
+
+def cache_stats():
+    return item_cache.stats()
@@ -0,0 +1,265 @@
+"""Multi-session load test for the Streamlit pages against the stub model backend
+
+Each simulated session uploads a photo on app.py, waits for detection, requests
+a recommendation, polls until the background analysis finishes, logs the meal
+and opens pages/3_Meal_Log.py. Sessions run concurrently in one process so they
+share the job queue and caches exactly like sessions on one server do.
+
+Similar-meal and per-item nutrition reuse are off unless --reuse-caches is given,
+so every session's analysis goes through the model path being measured.
+
+    python loadtest.py --sessions 50 --concurrency 10 --latency-ms 1500 --error-rate 0.05
+"""
+import os
+
+# Must be set before anything imports model_backend
+os.environ["MODEL_BACKEND"] = "stub"
+
+import argparse
+import io
+import math
+import random
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import streamlit as st
+from PIL import Image
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+import admission
+import cassette
+import item_cache
+import model_backend
+import similar_meals
+import stub_backend
+from memory_budget import payload_size
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(ROOT, "app.py")
+MEAL_LOG_PAGE = "pages/3_Meal_Log.py"
+UPLOAD_KEY = "_load_test_upload"
+
+
+class FakeUploadedFile(io.BytesIO):
+    """Just enough of UploadedFile for the pages"""
+
+    def __init__(self, data, name="meal.png", mime_type="image/png"):
+        super().__init__(data)
+        self.name = name
+        self.type = mime_type
+
+
+def fake_file_uploader(label, *args, **kwargs):
+    """Stand-in for st.file_uploader that returns the photos staged for this session"""
+    photos = st.session_state.get(UPLOAD_KEY) or []
+    files = [FakeUploadedFile(data, name=f"meal{i}.png") for i, data in enumerate(photos)]
+    if kwargs.get("accept_multiple_files"):
+        return files
+    return files[0] if files else None
+
+
+class SessionAppTest(AppTest):
+    """AppTest that leaves process-wide runtime setup to the harness so sessions can run concurrently"""
+
+    def _run(self, widget_state=None, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        pages_manager = PagesManager(self._script_path, setup_watcher=False)
+        script_runner = LocalScriptRunner(
+            self._script_path,
+            self.session_state,
+            pages_manager,
+            args=self.args,
+            kwargs=self.kwargs,
+        )
+        self._tree = script_runner.run(widget_state, self.query_params, timeout, self._page_hash)
+        self._tree._runner = self
+        return self
+
+
+def install_runtime():
+    """One mock runtime and patched uploader shared by every simulated session"""
+    mock_runtime = MagicMock(spec=Runtime)
+    mock_runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    mock_runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = mock_runtime
+    st.file_uploader = fake_file_uploader
+
+
+def disable_reuse():
+    """Send every analysis to the model instead of answering from earlier sessions' results"""
+    similar_meals.similar_meals.threshold = math.inf
+    item_cache.item_cache.max_size = 0
+
+
+def make_photo(seed, size=512):
+    """Random PNG so every session uploads different bytes"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (size, size))
+    image.putdata([
+        (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        for _ in range(size * size // 64)
+    ] * 64)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class SessionResult:
+    def __init__(self, session):
+        self.session = session
+        self.rerun_times = []
+        self.errors = []
+        self.completed = False
+        self.state_bytes = 0
+
+
+def timed_run(at, result, timeout):
+    start = time.perf_counter()
+    at.run(timeout=timeout)
+    result.rerun_times.append(time.perf_counter() - start)
+    if at.exception:
+        result.errors.extend(e.message for e in at.exception)
+    result.errors.extend(e.value for e in at.error)
+    return at
+
+
+def wait_for_jobs(at, result, args, what):
+    """Rerun while the page shows a background job in progress"""
+    deadline = time.monotonic() + args.timeout
+    # A run cut short by the poller's st.rerun() comes back empty, run it again too
+    while not at.main.children or (at.info and any("⏳" in info.value for info in at.info)):
+        if time.monotonic() > deadline:
+            result.errors.append(f"{what} did not finish in time")
+            break
+        time.sleep(args.poll_interval)
+        timed_run(at, result, args.timeout)
+
+
+def run_session(session, args):
+    """Drive one simulated user through upload, analysis, logging and the Meal Log"""
+    result = SessionResult(session)
+    try:
+        at = SessionAppTest(APP_PATH, default_timeout=args.timeout)
+        at.session_state[UPLOAD_KEY] = [make_photo(session * 100 + i) for i in range(args.photos)]
+        timed_run(at, result, args.timeout)
+        wait_for_jobs(at, result, args, "detection")
+
+        at.button(key="provide_recommendation").click()
+        timed_run(at, result, args.timeout)
+        wait_for_jobs(at, result, args, "analysis")
+
+        at.button(key="log_activity").click()
+        timed_run(at, result, args.timeout)
+
+        at.switch_page(MEAL_LOG_PAGE)
+        timed_run(at, result, args.timeout)
+
+        state = at.session_state.filtered_state
+        if not state.get("meal_log"):
+            result.errors.append("meal was not logged")
+        result.state_bytes = payload_size(state)
+        result.completed = not result.errors
+    except Exception as e:
+        result.errors.append(str(e))
+    return result
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(results, wall_time, memory_delta):
+    rerun_times = [t for r in results for t in r.rerun_times]
+    completed = sum(r.completed for r in results)
+    failed = [r for r in results if not r.completed]
+    sessions = len(results)
+
+    print(f"Sessions:            {sessions} ({completed} completed, {len(failed)} with errors)")
+    print(f"Wall time:           {wall_time:.2f}s")
+    print(f"Throughput:          {len(rerun_times) / wall_time:.1f} reruns/s, "
+          f"{completed / wall_time:.2f} logged meals/s")
+    print(f"Rerun latency p50:   {percentile(rerun_times, 50) * 1000:.0f} ms")
+    print(f"Rerun latency p95:   {percentile(rerun_times, 95) * 1000:.0f} ms")
+    print(f"Rerun latency p99:   {percentile(rerun_times, 99) * 1000:.0f} ms")
+    if rerun_times:
+        print(f"Rerun latency mean:  {statistics.mean(rerun_times) * 1000:.0f} ms over {len(rerun_times)} reruns")
+    print(f"Session state/session: {statistics.mean(r.state_bytes for r in results) / 1024:.0f} KB")
+    print(f"Heap growth/session:   {memory_delta / max(sessions, 1) / 1024:.0f} KB")
+    for r in failed[:5]:
+        print(f"  session {r.session}: {r.errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Streamlit pages with a fake model backend")
+    parser.add_argument("--sessions", type=int, default=20, help="simulated users")
+    parser.add_argument("--concurrency", type=int, default=10, help="users active at the same time")
+    parser.add_argument("--latency-ms", type=float, default=1000, help="median fake model latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.25, help="log-normal spread of model latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of model calls that fail")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="seconds between progress reruns")
+    parser.add_argument("--timeout", type=float, default=60, help="per-rerun and per-analysis timeout")
+    parser.add_argument("--cassette", help="replay model responses from this cassette instead of the stub")
+    parser.add_argument("--cassette-latency", default="recorded", help='"recorded", or fixed ms per replayed call')
+    parser.add_argument("--photos", type=int, default=1, help="photos per meal, one per dish")
+    parser.add_argument("--model-rpm", type=float, help="model calls per minute, 0 for no limit")
+    parser.add_argument("--model-concurrency", type=int, help="model calls in flight at once")
+    parser.add_argument("--reuse-caches", action="store_true",
+                        help="let sessions reuse similar-meal and per-item results like a warm server")
+    args = parser.parse_args()
+
+    stub_backend.configure(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate
+    )
+    if args.cassette:
+        # Photos are random per session, so match recorded requests on their text only
+        cassette.configure(args.cassette, match="text", latency=args.cassette_latency)
+        model_backend.set_cassette_mode("replay")
+    admission.controller.configure(
+        requests_per_minute=args.model_rpm,
+        max_concurrent=args.model_concurrency
+    )
+    if not args.reuse_caches:
+        disable_reuse()
+    install_runtime()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    with patch_config_options({"global.appTest": True}):
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda s: run_session(s, args), range(args.sessions)))
+    wall_time = time.perf_counter() - start
+    memory_delta = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    report(results, wall_time, memory_delta)
+    admitted = admission.stats()
+    print(f"Model calls admitted:  {admitted['admitted']}, mean wait {admitted['mean_wait_s']}")
+    reused = similar_meals.stats()
+    print(f"Similar meals reused:  {reused['hits']} of {reused['hits'] + reused['misses']} analyses")
+    items = item_cache.cache_stats()
+    print(f"Item nutrition reused: {items['hits']} of {items['hits'] + items['misses']} items")
+    if args.cassette:
+        replayed = cassette.stats()
+        print(f"Cassette:              {replayed['hits']} replayed, {replayed['misses']} missing")
+
+
+if __name__ == "__main__":
+    main()
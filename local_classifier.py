@@ -0,0 +1,127 @@
+"""Optional on-box CPU food classifier used as a fast first detection tier
+
+Needs onnxruntime (pip install onnxruntime) and an image classification model,
+e.g. a quantized MobileNet fine-tuned on Food-101:
+
+    LOCAL_CLASSIFIER_MODEL=models/food101_int8.onnx
+    LOCAL_CLASSIFIER_LABELS=models/food101_labels.txt
+
+The labels file has one class per line in model output order, optionally with a
+typical portion in grams: "pizza|250". Without onnxruntime or a model the tier
+is simply off and detection goes straight to Gemini.
+"""
+import io
+import logging
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.getenv("LOCAL_CLASSIFIER_MODEL")
+LABELS_PATH = os.getenv("LOCAL_CLASSIFIER_LABELS")
+TOP_K = int(os.getenv("LOCAL_CLASSIFIER_TOP_K", "3"))
+# Predictions below this probability are not shown to the user
+MIN_CONFIDENCE = float(os.getenv("LOCAL_CLASSIFIER_MIN_CONFIDENCE", "0.15"))
+THREADS = int(os.getenv("LOCAL_CLASSIFIER_THREADS", "1"))
+DEFAULT_PORTION_GRAMS = 150
+
+# ImageNet normalization, which is what the usual backbones are trained with
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def load_labels(path):
+    """Return [(label, portion_grams)] in model output order"""
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            name, _, grams = line.partition("|")
+            label = name.strip().replace("_", " ")
+            labels.append((label, float(grams) if grams.strip() else DEFAULT_PORTION_GRAMS))
+    return labels
+
+
+class LocalClassifier:
+    """ONNX image classifier run on the CPU, loaded once per process"""
+
+    def __init__(self, model_path, labels, threads=THREADS):
+        options = ort.SessionOptions()
+        # Sessions share the box, keep each inference to a thread or two
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.labels = labels
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        shape = model_input.shape
+        self.channels_first = shape[1] == 3
+        size = shape[2] if self.channels_first else shape[1]
+        self.size = size if isinstance(size, int) else 224
+
+    def preprocess(self, image_bytes):
+        image = Image.open(io.BytesIO(image_bytes))
+        # Cheap JPEG downscale before the real resize, only works before the image is decoded
+        image.draft("RGB", (self.size * 2, self.size * 2))
+        image = image.convert("RGB").resize((self.size, self.size), Image.BILINEAR)
+        array = (np.asarray(image, dtype=np.float32) / 255.0 - MEAN) / STD
+        if self.channels_first:
+            array = array.transpose(2, 0, 1)
+        return array[np.newaxis].astype(np.float32)
+
+    def predict(self, image_bytes, top_k=TOP_K):
+        """Return the top_k (label, probability, portion_grams) guesses"""
+        logits = self.session.run(None, {self.input_name: self.preprocess(image_bytes)})[0][0]
+        logits = logits - logits.max()
+        probabilities = np.exp(logits) / np.exp(logits).sum()
+        best = np.argsort(probabilities)[::-1][:top_k]
+        return [(self.labels[i][0], float(probabilities[i]), self.labels[i][1]) for i in best]
+
+    def detect(self, image_bytes, min_confidence=MIN_CONFIDENCE):
+        """Bullet list in the same format as the Gemini detection, or None if unsure"""
+        guesses = [guess for guess in self.predict(image_bytes) if guess[1] >= min_confidence]
+        if not guesses:
+            return None
+        return "\n".join(f"• {label} ({grams:.0f}g)" for label, _, grams in guesses)
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+_load_failed = False
+
+
+def get_local_classifier():
+    """The process-wide classifier, or None when the tier is not set up"""
+    global _classifier, _load_failed
+    if ort is None or not MODEL_PATH or not LABELS_PATH or _load_failed:
+        return None
+    with _classifier_lock:
+        if _classifier is None and not _load_failed:
+            try:
+                _classifier = LocalClassifier(MODEL_PATH, load_labels(LABELS_PATH))
+            except Exception as e:
+                logger.warning("Local classifier disabled: %s", e)
+                _load_failed = True
+        return _classifier
+
+
+def local_detect(image_content):
+    """Quick on-device guess at the food items, None if unavailable or not confident"""
+    classifier = get_local_classifier()
+    if classifier is None or not image_content:
+        return None
+    try:
+        return classifier.detect(image_content[0]["data"])
+    except Exception as e:
+        logger.warning("Local classification failed: %s", e)
+        return None
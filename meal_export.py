@@ -0,0 +1,215 @@
+import hashlib
+import io
+import itertools
+import os
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from meal_records import MealRecord, NUTRIENTS, FOCUS_AREAS, SUGGESTION_KEYS, NOT_SCORED
+from image_store import find_stored
+
+BATCH_SIZE = 1024
+# Smaller batches when photos are embedded, so one batch doesn't hold a thousand images
+IMAGE_BATCH_SIZE = 64
+
+# Focus area name -> column prefix, in MealRecord.focus_scores order
+FOCUS_AREA_COLUMNS = dict(zip(FOCUS_AREAS, [
+    'hormonal_balance',
+    'inflammation_gut',
+    'energy_mental',
+    'reproductive_health',
+]))
+
+MEAL_SCHEMA = pa.schema(
+    [
+        ('meal_type', pa.string()),
+        ('name', pa.string()),
+        ('details', pa.string()),
+        ('date', pa.date32()),
+        ('time', pa.string()),
+        ('image_ref', pa.string()),
+    ]
+    + [(nutrient, pa.int16()) for nutrient in NUTRIENTS]
+    + [('pcos_score', pa.string())]
+    + [(f"{column}_score", pa.int8()) for column in FOCUS_AREA_COLUMNS.values()]
+    + [(f"{column}_explanation", pa.string()) for column in FOCUS_AREA_COLUMNS.values()]
+    + [(key, pa.string()) for key in SUGGESTION_KEYS]
+    # Photo bytes, only filled in when the export includes images
+    + [('image', pa.binary())]
+)
+
+FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+}
+
+
+def image_digest(image_bytes):
+    """Content address for image bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _meal_columns(meals, load_image=None, image_dir=None, include_images=False):
+    """Convert a chunk of meal records into typed column lists"""
+    columns = {field.name: [] for field in MEAL_SCHEMA}
+    for meal in meals:
+        columns['meal_type'].append(meal.meal_type)
+        columns['name'].append(meal.name)
+        columns['details'].append(meal.details)
+        columns['date'].append(_parse_date(meal.date))
+        columns['time'].append(meal.time)
+
+        image = meal.image
+        if load_image is not None:
+            image = load_image(image)
+        image_ref = None
+        if isinstance(image, (bytes, bytearray)) and image:
+            image_ref = image_digest(image)
+            if image_dir:
+                path = os.path.join(image_dir, f"{image_ref}.png")
+                if not os.path.exists(path):
+                    with open(path, 'wb') as f:
+                        f.write(image)
+        columns['image_ref'].append(image_ref)
+        columns['image'].append(bytes(image) if include_images and image_ref else None)
+
+        for nutrient in NUTRIENTS:
+            columns[nutrient].append(getattr(meal, nutrient))
+
+        columns['pcos_score'].append(meal.pcos_score or None)
+        scored = zip(FOCUS_AREA_COLUMNS.values(), meal.focus_scores, meal.focus_explanations)
+        for column, score, explanation in scored:
+            columns[f"{column}_score"].append(score if score != NOT_SCORED else None)
+            columns[f"{column}_explanation"].append(explanation if score != NOT_SCORED else None)
+        for key, text in zip(SUGGESTION_KEYS, meal.suggestion_texts):
+            columns[key].append(text or None)
+    return columns
+
+
+def iter_record_batches(meal_log, batch_size=BATCH_SIZE, load_image=None, image_dir=None, include_images=False):
+    """Yield the meal log as Arrow record batches of at most batch_size meals"""
+    if image_dir:
+        os.makedirs(image_dir, exist_ok=True)
+    if include_images:
+        batch_size = min(batch_size, IMAGE_BATCH_SIZE)
+    meals = iter(meal_log)
+    while True:
+        chunk = list(itertools.islice(meals, batch_size))
+        if not chunk:
+            break
+        columns = _meal_columns(chunk, load_image, image_dir, include_images)
+        yield pa.RecordBatch.from_pydict(columns, schema=MEAL_SCHEMA)
+
+
+def export_meal_log(meal_log, sink, fmt='parquet', batch_size=BATCH_SIZE, load_image=None, image_dir=None,
+                    include_images=False):
+    """Stream the meal log to a Parquet or Arrow IPC file, one record batch at a time"""
+    batches = iter_record_batches(meal_log, batch_size, load_image, image_dir, include_images)
+    if fmt == 'parquet':
+        with pq.ParquetWriter(sink, MEAL_SCHEMA) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    elif fmt == 'arrow':
+        with ipc.new_file(sink, MEAL_SCHEMA) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def export_meal_log_bytes(meal_log, fmt='parquet', load_image=None, include_images=True):
+    """Export the meal log into an in-memory buffer for downloading, photos embedded by default"""
+    buffer = io.BytesIO()
+    export_meal_log(meal_log, buffer, fmt=fmt, load_image=load_image, include_images=include_images)
+    return buffer.getvalue()
+
+
+def _detect_format(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            magic = f.read(6)
+    else:
+        position = source.tell()
+        magic = source.read(6)
+        source.seek(position)
+    if magic[:4] == b'PAR1':
+        return 'parquet'
+    if magic == b'ARROW1':
+        return 'arrow'
+    raise ValueError("Unrecognized meal history file")
+
+
+def iter_import_batches(source, batch_size=BATCH_SIZE):
+    """Yield record batches from a Parquet or Arrow IPC meal history file"""
+    fmt = _detect_format(source)
+    if fmt == 'parquet':
+        parquet_file = pq.ParquetFile(source)
+        yield from parquet_file.iter_batches(batch_size=batch_size)
+    else:
+        reader = ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+
+
+def read_meal_table(source):
+    """Read a whole meal history file as an Arrow table"""
+    return pa.Table.from_batches(list(iter_import_batches(source)))
+
+
+def load_dataframe(source):
+    """Load a meal history file into pandas without per-row Python work"""
+    return read_meal_table(source).to_pandas()
+
+
+def _load_image(row, image_dir):
+    """Photo for an imported row: embedded bytes, then the export's image directory, then the image store"""
+    if row.get('image'):
+        return row['image']
+    image_ref = row['image_ref']
+    if not image_ref:
+        return None
+    if image_dir:
+        path = os.path.join(image_dir, f"{image_ref}.png")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+    # Same sha256 content address as the image store
+    return find_stored(image_ref)
+
+
+def iter_imported_meals(source, batch_size=BATCH_SIZE, image_dir=None):
+    """Stream meal records back out of a Parquet or Arrow IPC meal history file"""
+    for batch in iter_import_batches(source, batch_size):
+        for row in batch.to_pylist():
+            date = row['date']
+            yield MealRecord(
+                meal_type=row['meal_type'] or '',
+                name=row['name'] or 'Unknown Meal',
+                details=row['details'] or '',
+                time=row['time'] or '',
+                date=date.strftime("%Y-%m-%d") if date else '',
+                image=_load_image(row, image_dir),
+                nutritional_values={nutrient: row[nutrient] for nutrient in NUTRIENTS},
+                pcos_analysis={
+                    'score': row['pcos_score'] or '',
+                    'focus_areas': {
+                        area: {
+                            'score': row[f"{column}_score"],
+                            'explanation': row[f"{column}_explanation"] or ''
+                        }
+                        for area, column in FOCUS_AREA_COLUMNS.items()
+                        if row[f"{column}_score"] is not None
+                    },
+                    'suggestions': {key: row[key] for key in SUGGESTION_KEYS if row[key] is not None},
+                },
+            )
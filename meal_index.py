@@ -0,0 +1,164 @@
+import bisect
+import re
+
+from meal_records import get_meal_log
+
+INDEX_KEY = "_meal_index"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "of", "the", "with", "in", "on", "g", "ml"}
+
+
+def tokenize(text):
+    """Lowercased word tokens, without stopwords and bare quantities"""
+    return {
+        token for token in TOKEN_PATTERN.findall((text or "").lower())
+        if token not in STOPWORDS and not token.isdigit()
+    }
+
+
+class MealIndex:
+    """Inverted index over meal name/details plus date, meal type and PCOS score"""
+
+    def __init__(self):
+        self._tokens = {}
+        self._dates = {}
+        self._meal_types = {}
+        self._scores = {}
+        # meal id -> (insertion sequence, indexed keys) so removal needs no rescan
+        self._entries = {}
+        self._sequence = 0
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, meal_id):
+        return meal_id in self._entries
+
+    @staticmethod
+    def _add(index, key, meal_id):
+        index.setdefault(key, set()).add(meal_id)
+
+    @staticmethod
+    def _discard(index, key, meal_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(meal_id)
+            if not ids:
+                del index[key]
+
+    def add(self, meal):
+        """Index a newly logged meal"""
+        meal_id = meal.id
+        if meal_id in self._entries:
+            self.update(meal)
+            return
+        tokens = tokenize(meal.name) | tokenize(meal.details)
+        date = meal.date
+        meal_type = meal.meal_type
+        score = meal.pcos_score
+
+        for token in tokens:
+            if token not in self._tokens:
+                self._vocabulary_dirty = True
+            self._add(self._tokens, token, meal_id)
+        self._add(self._dates, date, meal_id)
+        self._add(self._meal_types, meal_type, meal_id)
+        self._add(self._scores, score, meal_id)
+
+        self._sequence += 1
+        self._entries[meal_id] = (self._sequence, tokens, date, meal_type, score)
+
+    def remove(self, meal_id):
+        """Drop a deleted meal from every index"""
+        entry = self._entries.pop(meal_id, None)
+        if entry is None:
+            return
+        _, tokens, date, meal_type, score = entry
+        for token in tokens:
+            self._discard(self._tokens, token, meal_id)
+            if token not in self._tokens:
+                self._vocabulary_dirty = True
+        self._discard(self._dates, date, meal_id)
+        self._discard(self._meal_types, meal_type, meal_id)
+        self._discard(self._scores, score, meal_id)
+
+    def update(self, meal):
+        """Re-index an edited meal, keeping its place in the log order"""
+        meal_id = meal.id
+        entry = self._entries.get(meal_id)
+        self.remove(meal_id)
+        self.add(meal)
+        if entry is not None:
+            sequence = entry[0]
+            self._entries[meal_id] = (sequence,) + self._entries[meal_id][1:]
+
+    def _token_matches(self, term):
+        """Meal ids for a search term, treating it as a prefix"""
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._tokens)
+            self._vocabulary_dirty = False
+        ids = set()
+        start = bisect.bisect_left(self._vocabulary, term)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            ids |= self._tokens[token]
+        return ids
+
+    def search(self, text="", meal_type=None, score=None, date=None):
+        """Meal ids matching every term and filter, newest first"""
+        candidates = None
+
+        def narrow(ids):
+            nonlocal candidates
+            candidates = set(ids) if candidates is None else candidates & ids
+
+        # Exact-match filters first, then the prefix lookups over the vocabulary
+        if date:
+            narrow(self._dates.get(date, set()))
+        if meal_type:
+            narrow(self._meal_types.get(meal_type, set()))
+        if score:
+            narrow(self._scores.get(score, set()))
+        for term in sorted(tokenize(text), key=len, reverse=True):
+            narrow(self._token_matches(term))
+            if not candidates:
+                return []
+
+        if candidates is None:
+            candidates = self._entries.keys()
+        return sorted(candidates, key=lambda meal_id: self._entries[meal_id][0], reverse=True)
+
+    def facets(self):
+        """Values available for the filter widgets"""
+        return {
+            'meal_types': sorted(k for k in self._meal_types if k),
+            'scores': sorted(k for k in self._scores if k),
+            'dates': sorted((k for k in self._dates if k), reverse=True),
+        }
+
+
+def get_meal_index(session_state):
+    """Return the session's meal index, rebuilding it if it drifted from the log"""
+    meal_log = get_meal_log(session_state)
+    index = session_state.get(INDEX_KEY)
+    last = meal_log.last()
+    if index is None or len(index) != len(meal_log) or (last is not None and last.id not in index):
+        index = MealIndex()
+        for meal in meal_log:
+            index.add(meal)
+        session_state[INDEX_KEY] = index
+    return index
+
+
+def index_meal(session_state, meal):
+    """Add a meal that was just appended to the log to the session's index"""
+    index = session_state.get(INDEX_KEY)
+    if index is None:
+        # Building from the log picks up the new meal too
+        get_meal_index(session_state)
+    else:
+        index.add(meal)
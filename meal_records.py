@@ -0,0 +1,177 @@
+import sys
+import uuid
+
+LOG_KEY = "meal_log"
+
+NUTRIENTS = ('protein', 'fat', 'carbs', 'fiber')
+FOCUS_AREAS = (
+    'Hormonal Balance & Insulin Sensitivity',
+    'Inflammation Control & Gut Health',
+    'Energy & Mental Health',
+    'Reproductive Health & Fertility',
+)
+SUGGESTION_KEYS = ('quick_fix', 'swap_out', 'pro_moves')
+
+# 0 in focus_scores means the area wasn't scored
+NOT_SCORED = 0
+MIN_FOCUS_SCORE = 1
+MAX_FOCUS_SCORE = 5
+
+
+def new_meal_id():
+    return uuid.uuid4().hex[:12]
+
+
+def _intern(value):
+    # Meal types and PCOS scores repeat across the log, share one string per value
+    return sys.intern(value) if value else ''
+
+
+def _nutrient(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def _focus_score(value):
+    try:
+        score = int(value)
+    except (TypeError, ValueError):
+        return NOT_SCORED
+    if score == NOT_SCORED:
+        return NOT_SCORED
+    # Out of range model output still has to fit the 1-5 scale and the export's int8 columns
+    return min(max(score, MIN_FOCUS_SCORE), MAX_FOCUS_SCORE)
+
+
+class MealRecord:
+    """One logged meal with flat numeric nutrition and focus-area fields"""
+    __slots__ = (
+        'id', 'meal_type', 'name', 'details', 'time', 'date', 'image',
+        'protein', 'fat', 'carbs', 'fiber',
+        'pcos_score', 'focus_scores', 'focus_explanations', 'suggestion_texts',
+    )
+
+    def __init__(self, meal_type='', name='Unknown Meal', details='', time='', date='', image=None,
+                 nutritional_values=None, pcos_analysis=None, meal_id=None):
+        self.id = meal_id or new_meal_id()
+        self.meal_type = _intern(meal_type)
+        self.name = name or 'Unknown Meal'
+        self.details = details or ''
+        self.time = time or ''
+        self.date = _intern(date)
+        self.image = image
+        self.set_nutrition(nutritional_values)
+        self.set_pcos_analysis(pcos_analysis)
+
+    def set_nutrition(self, nutritional_values):
+        values = nutritional_values or {}
+        for nutrient in NUTRIENTS:
+            setattr(self, nutrient, _nutrient(values.get(nutrient)))
+
+    def set_pcos_analysis(self, pcos_analysis):
+        """Take an analysis as analyze_meal returns it ('pcos_score') or as older logs stored it ('score')"""
+        pcos = pcos_analysis or {}
+        self.pcos_score = _intern(pcos.get('pcos_score') or pcos.get('score') or '')
+        focus_areas = pcos.get('focus_areas') or {}
+        # Scores are 1-5, one byte each
+        self.focus_scores = bytes(
+            _focus_score((focus_areas.get(area) or {}).get('score')) for area in FOCUS_AREAS
+        )
+        self.focus_explanations = tuple(
+            (focus_areas.get(area) or {}).get('explanation') or '' for area in FOCUS_AREAS
+        )
+        suggestions = pcos.get('suggestions') or {}
+        self.suggestion_texts = tuple(suggestions.get(key) or '' for key in SUGGESTION_KEYS)
+
+    @property
+    def nutritional_values(self):
+        """Macro shares in percent, only the ones that are known"""
+        return {
+            nutrient: getattr(self, nutrient)
+            for nutrient in NUTRIENTS
+            if getattr(self, nutrient) is not None
+        }
+
+    @property
+    def focus_areas(self):
+        return {
+            area: {'score': score, 'explanation': explanation}
+            for area, score, explanation in zip(FOCUS_AREAS, self.focus_scores, self.focus_explanations)
+            if score != NOT_SCORED
+        }
+
+    @property
+    def suggestions(self):
+        return {key: text for key, text in zip(SUGGESTION_KEYS, self.suggestion_texts) if text}
+
+    @classmethod
+    def from_dict(cls, meal):
+        """Convert a meal dict in the old nested layout"""
+        return cls(
+            meal_type=meal.get('meal_type', ''),
+            name=meal.get('name', 'Unknown Meal'),
+            details=meal.get('details', ''),
+            time=meal.get('time', ''),
+            date=meal.get('date', ''),
+            image=meal.get('image'),
+            nutritional_values=(meal.get('nutrition_analysis') or {}).get('values'),
+            pcos_analysis=meal.get('pcos_analysis'),
+            meal_id=meal.get('id'),
+        )
+
+    def __repr__(self):
+        return f"MealRecord({self.id}, {self.name!r}, {self.date} {self.time})"
+
+
+class MealLog:
+    """Meals in logging order, addressed by id for O(1) lookup, edit and delete"""
+    __slots__ = ('_meals',)
+
+    def __init__(self, meals=()):
+        # dicts keep insertion order and delete without shifting the rest
+        self._meals = {}
+        for meal in meals:
+            self.append(meal)
+
+    def __len__(self):
+        return len(self._meals)
+
+    def __contains__(self, meal_id):
+        return meal_id in self._meals
+
+    def __iter__(self):
+        """Oldest first"""
+        return iter(self._meals.values())
+
+    def newest_first(self):
+        return reversed(self._meals.values())
+
+    def last(self):
+        return next(self.newest_first(), None)
+
+    def get(self, meal_id):
+        return self._meals.get(meal_id)
+
+    def append(self, meal):
+        if isinstance(meal, dict):
+            meal = MealRecord.from_dict(meal)
+        while meal.id in self._meals:
+            meal.id = new_meal_id()
+        self._meals[meal.id] = meal
+        return meal
+
+    def remove(self, meal_id):
+        return self._meals.pop(meal_id, None)
+
+
+def get_meal_log(session_state):
+    """Return the session's meal log, converting a plain list of meal dicts if one is there"""
+    meal_log = session_state.get(LOG_KEY)
+    if not isinstance(meal_log, MealLog):
+        meal_log = MealLog(meal_log or ())
+        session_state[LOG_KEY] = meal_log
+    return meal_log
@@ -0,0 +1,178 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+
+from image_store import StoredImage
+from meal_records import get_meal_log
+
+# Per-session budget for session-state payloads, in megabytes
+DEFAULT_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", "16"))
+SPILL_ROOT = os.getenv("SESSION_SPILL_DIR") or os.path.join(tempfile.gettempdir(), "wai_session_spill")
+
+ACCOUNTANT_KEY = "_memory_accountant"
+
+
+class SpilledImage:
+    """Reference to image bytes that were moved out of memory into a temp file"""
+    __slots__ = ("path", "size")
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def __repr__(self):
+        return f"SpilledImage({os.path.basename(self.path)}, {self.size} bytes)"
+
+
+def _remove_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def payload_size(value, _seen=None):
+    """Estimate the in-memory payload size of a session state value"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if isinstance(value, SpilledImage):
+        return sys.getsizeof(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    if isinstance(value, dict):
+        return sum(payload_size(k, _seen) + payload_size(v, _seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(payload_size(v, _seen) for v in value)
+    # PIL images keep their pixel buffer outside of getsizeof
+    if hasattr(value, "size") and hasattr(value, "mode") and hasattr(value, "getbands"):
+        width, height = value.size
+        return width * height * len(value.getbands())
+    if hasattr(value, "__slots__"):
+        return sum(payload_size(getattr(value, s, None), _seen) for s in value.__slots__)
+    return sys.getsizeof(value)
+
+
+class SessionMemoryAccountant:
+    """Track session state payload sizes and spill meal images to disk over budget"""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, spill_root=SPILL_ROOT):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.spill_dir = os.path.join(spill_root, uuid.uuid4().hex)
+        self._lock = threading.Lock()
+        self._sizes = {}
+        self.spilled_count = 0
+        self.spilled_bytes = 0
+        self.reloads = 0
+        # Spilled files live exactly as long as the session that owns them
+        self._finalizer = weakref.finalize(self, _remove_dir, self.spill_dir)
+
+    def measure(self, session_state):
+        """Measure every session state key, skipping the accountant itself"""
+        sizes = {}
+        for key in list(session_state.keys()):
+            if key == ACCOUNTANT_KEY:
+                continue
+            try:
+                sizes[key] = payload_size(session_state[key])
+            except Exception:
+                continue
+        with self._lock:
+            self._sizes = sizes
+        return sizes
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def spill(self, image_bytes):
+        """Write image bytes to the session spill directory"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.img")
+        with open(path, "wb") as f:
+            f.write(image_bytes)
+        with self._lock:
+            self.spilled_count += 1
+            self.spilled_bytes += len(image_bytes)
+        return SpilledImage(path, len(image_bytes))
+
+    def enforce(self, session_state, meal_log):
+        """Spill the oldest in-memory meal images until the session fits its budget"""
+        self.measure(session_state)
+        overflow = self.total_bytes() - self.budget_bytes
+        if overflow <= 0:
+            return 0
+
+        freed = 0
+        for meal in meal_log:
+            if freed >= overflow:
+                break
+            image = meal.image
+            if isinstance(image, (bytes, bytearray)) and image:
+                meal.image = self.spill(bytes(image))
+                freed += len(image)
+
+        self.measure(session_state)
+        return freed
+
+    def load(self, image):
+        """Return image bytes whether they are in memory or spilled"""
+        if isinstance(image, SpilledImage):
+            with self._lock:
+                self.reloads += 1
+            return image.load()
+        return image
+
+    def stats(self):
+        with self._lock:
+            sizes = dict(self._sizes)
+            spilled_count = self.spilled_count
+            spilled_bytes = self.spilled_bytes
+            reloads = self.reloads
+        return {
+            "budget_bytes": self.budget_bytes,
+            "in_memory_bytes": sum(sizes.values()),
+            "spilled_images": spilled_count,
+            "spilled_bytes": spilled_bytes,
+            "reloads": reloads,
+            "largest_keys": sorted(sizes.items(), key=lambda kv: kv[1], reverse=True)[:5],
+        }
+
+
+def get_accountant(session_state):
+    """Return the memory accountant attached to this session, creating it if needed"""
+    if ACCOUNTANT_KEY not in session_state:
+        session_state[ACCOUNTANT_KEY] = SessionMemoryAccountant()
+    return session_state[ACCOUNTANT_KEY]
+
+
+def enforce_budget(session_state):
+    """Re-measure the session and spill meal images if it is over budget"""
+    accountant = get_accountant(session_state)
+    return accountant.enforce(session_state, get_meal_log(session_state))
+
+
+def load_image_bytes(session_state, image):
+    """Load meal image bytes, re-reading spilled or stored images on demand"""
+    if isinstance(image, SpilledImage):
+        return get_accountant(session_state).load(image)
+    if isinstance(image, StoredImage):
+        return image.load()
+    return image
+
+
+def memory_stats(session_state):
+    """Per-session memory stats for display"""
+    accountant = get_accountant(session_state)
+    accountant.measure(session_state)
+    return accountant.stats()
@@ -0,0 +1,46 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# "gemini" talks to the real API, "stub" answers locally with canned responses
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini")
+# "record" saves every response to a cassette, "replay" answers from it without the backend
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "")
+
+import cassette
+
+if MODEL_BACKEND == "stub":
+    from stub_backend import StubModel
+
+_genai = None
+
+
+def _gemini():
+    """google.generativeai, imported and configured on first use so replay runs don't need it"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        _genai = genai
+    return _genai
+
+
+def set_cassette_mode(mode):
+    """Switch between "record", "replay" and "" (off) at runtime"""
+    global CASSETTE_MODE
+    CASSETTE_MODE = mode or ""
+
+
+def get_model(model_name, **kwargs):
+    """Return a generative model for the configured backend"""
+    if CASSETTE_MODE == "replay":
+        return cassette.ReplayModel(model_name, **kwargs)
+    if MODEL_BACKEND == "stub":
+        model = StubModel(model_name, **kwargs)
+    else:
+        model = _gemini().GenerativeModel(model_name, **kwargs)
+    if CASSETTE_MODE == "record":
+        return cassette.RecordingModel(model, model_name)
+    return model
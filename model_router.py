@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+from stages import get_stage
+
+# Weight of the newest sample in the moving latency average
+EWMA_ALPHA = 0.3
+# How long a model that breached its SLO is skipped before it gets another try
+DEMOTION_SECONDS = float(os.getenv("ROUTER_DEMOTION_SECONDS", "60"))
+
+
+class ModelRouter:
+    """Pick a model per stage, falling back to faster tiers when a latency SLO is breached"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._calls = {}
+        self._demoted_until = {}
+
+    def stage_config(self, label):
+        return get_stage(label)
+
+    def route(self, label):
+        """Return the stage config and the model to use for this call"""
+        stage = self.stage_config(label)
+        now = time.monotonic()
+        with self._lock:
+            for model_name in stage.models:
+                if self._demoted_until.get((stage.name, model_name), 0) <= now:
+                    return stage, model_name
+        return stage, stage.models[-1]
+
+    def record(self, label, model_name, latency_s, ok=True):
+        """Feed back an observed call latency; errors count as SLO breaches"""
+        stage = self.stage_config(label)
+        key = (stage.name, model_name)
+        latency_ms = latency_s * 1000
+        with self._lock:
+            previous = self._latency.get(key)
+            average = latency_ms if previous is None else EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * previous
+            self._latency[key] = average
+            self._calls[key] = self._calls.get(key, 0) + 1
+            if not ok or average > stage.latency_slo_ms:
+                # Don't demote the last tier, there is nothing faster to go to
+                if model_name != stage.models[-1]:
+                    self._demoted_until[key] = time.monotonic() + DEMOTION_SECONDS
+                    # Start fresh when the model is retried after the demotion window
+                    self._latency.pop(key, None)
+            else:
+                self._demoted_until.pop(key, None)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                f"{stage}/{model}": {
+                    "calls": self._calls.get((stage, model), 0),
+                    "latency_ms": round(self._latency[(stage, model)]) if (stage, model) in self._latency else None,
+                    "demoted": self._demoted_until.get((stage, model), 0) > now,
+                }
+                for stage, model in self._calls
+            }
+
+
+router = ModelRouter()
@@ -1,5 +1,8 @@
 import streamlit as st
 import pandas as pd
+from analysis_jobs import cancel_on_navigation
+from rerun_profiler import profile_rerun
+from speculation import speculation_enabled
 
 # 使用与 app.py 相同的 CSS
 css = """
@@ -118,6 +121,9 @@ def main():
     
     st.title("Profile")
 
+    # Leaving the upload page makes any running food detection pointless
+    cancel_on_navigation(st.session_state)
+
     # Profile Header
     with st.container():
         st.markdown("""
@@ -236,6 +242,15 @@ def main():
             st.success("Dietary preference updated successfully!")
             st.rerun()
 
+    # Analysis settings
+    st.markdown("### Settings")
+    st.session_state.speculative_analysis = st.toggle(
+        "Prepare recommendations while I review detected items",
+        value=speculation_enabled(st.session_state),
+        help="Starts the analysis as soon as food is detected. Faster results, "
+             "but the work is wasted if you edit the items."
+    )
+
     # Nutri Score
     st.markdown("### Nutri Score")
     st.markdown("""
@@ -281,4 +296,5 @@ def main():
     navigation()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_rerun(st.session_state, st.query_params, "profile"):
+        main()
\ No newline at end of file
@@ -1,8 +1,24 @@
 import streamlit as st
-from PIL import Image
-import io
 from datetime import datetime
 import streamlit.components.v1 as components
+from memory_budget import load_image_bytes, memory_stats, enforce_budget
+from meal_export import FORMATS, export_meal_log_bytes, iter_imported_meals
+from analysis_jobs import pending_jobs, job_to_meal, cancel_on_navigation, release_job_images, FAILED
+from cancellation import registry as cancellation_registry
+from meal_index import get_meal_index, index_meal
+from meal_records import get_meal_log
+from daily_digest import day_meals, cached_digest, daily_digest
+from analysis_client import get_pipeline
+from analysis import parse_daily_digest
+from rerun_profiler import profile_rerun
+from speculation import stats as speculation_stats
+from admission import stats as admission_stats
+from image_store import ensure_stored, image_html, session_images
+from html import escape
+import time
+
+# Cap on cards rendered for a search, the index itself answers over the whole log
+MAX_SEARCH_RESULTS = 100
 
 # Unified CSS styles
 css = """
@@ -129,19 +145,19 @@ def create_meal_card(meal):
         'Promising': 'green',
         'Can Do Better': 'orange',
         'Needs Improvement': 'red'
-    }.get(meal.get('pcos_analysis', {}).get('score', ''), 'gray')
+    }.get(meal.pcos_score, 'gray')
 
     html = f"""
     <div class="meal-card">
         <div style="display: flex; justify-content: space-between; align-items: start;">
             <div>
-                <div style="color: #666; font-size: 0.9em;">{meal['meal_type']}</div>
-                <div style="font-weight: bold; margin: 5px 0;">{meal['name']}</div>
-                <div style="color: #888; font-size: 0.9em;">{meal['time']} • {meal['date']}</div>
+                <div style="color: #666; font-size: 0.9em;">{meal.meal_type}</div>
+                <div style="font-weight: bold; margin: 5px 0;">{meal.name}</div>
+                <div style="color: #888; font-size: 0.9em;">{meal.time} • {meal.date}</div>
             </div>
             <div>
                 <span style="color: {score_color}; font-weight: bold;">
-                    {meal.get('pcos_analysis', {}).get('score', 'Not Analyzed')}
+                    {meal.pcos_score or 'Not Analyzed'}
                 </span>
             </div>
         </div>
@@ -240,21 +256,177 @@ def nutrition_bar_chart(nutritional_values):
     </div>
     """
 
+def pending_analyses():
+    """Show background analyses that finished or are still running for this session"""
+    for job in pending_jobs(st.session_state):
+        meal_name = job.meta.get('meal_name', 'Unknown Meal')
+        if not job.is_finished:
+            st.info(f"⏳ {meal_name}: {job.progress} ({job.elapsed():.0f}s)")
+        elif job.status == FAILED:
+            st.error(f"Analysis of {meal_name} failed: {job.error}")
+            if st.button("Dismiss", key=f"dismiss_job_{job.id}"):
+                job.delivered = True
+                st.rerun()
+        else:
+            st.success(f"Analysis of {meal_name} is ready.")
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                if st.button("💾 Save to Log", key=f"save_job_{job.id}"):
+                    meal = get_meal_log(st.session_state).append(job_to_meal(job))
+                    session_images(st.session_state).hold(f"meal:{meal.id}", [meal.image])
+                    index_meal(st.session_state, meal)
+                    enforce_budget(st.session_state)
+                    job.delivered = True
+                    st.rerun()
+            with col2:
+                if st.button("❌ Dismiss", key=f"dismiss_job_{job.id}"):
+                    job.delivered = True
+                    st.rerun()
+
+@st.fragment(run_every=1.0)
+def pending_analyses_poller():
+    """Keep polling while any background analysis is still running"""
+    pending_analyses()
+    if not any(not job.is_finished for job in pending_jobs(st.session_state)):
+        st.rerun()
+
+def search_filters(index):
+    """Search bar and filters over the meal log"""
+    facets = index.facets()
+    query = st.text_input("🔍 Search meals", key="meal_search", placeholder="e.g. salmon")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        meal_type = st.selectbox("Meal", ["All"] + facets['meal_types'], key="filter_meal_type")
+    with col2:
+        score = st.selectbox("PCOS Score", ["All"] + facets['scores'], key="filter_score")
+    with col3:
+        date = st.selectbox("Date", ["All"] + facets['dates'], key="filter_date")
+    return (
+        query.strip(),
+        None if meal_type == "All" else meal_type,
+        None if score == "All" else score,
+        None if date == "All" else date
+    )
+
+def daily_digest_section(meal_log, dates):
+    """Whole-day feedback from one request, reused until that day's meals change"""
+    with st.expander("📅 Daily Digest"):
+        date = st.selectbox("Day", dates, key="digest_date")
+        meals = day_meals(meal_log, date)
+        symptoms = st.session_state.get('selected_symptoms', [])
+        dietary_preference = st.session_state.get('dietary_preference', '')
+        digest = cached_digest(st.session_state, date, meals, symptoms, dietary_preference)
+        if digest is None:
+            if not st.button(f"Get Daily Feedback ({len(meals)} meals, one request)", key="get_digest"):
+                return
+            with st.spinner("Reviewing the day..."):
+                try:
+                    digest = daily_digest(
+                        st.session_state, date, meals, get_pipeline().get_daily_digest, parse_daily_digest,
+                        symptoms, dietary_preference
+                    )
+                except RuntimeError as e:
+                    st.error(f"Error getting daily feedback: {e}")
+                    return
+
+        score_color = {
+            'Promising': 'green',
+            'Can Do Better': 'orange',
+            'Needs Improvement': 'red'
+        }.get(digest['day_score'], 'gray')
+        st.markdown(f"**Day score:** <span style='color: {score_color}; font-weight: bold;'>"
+                    f"{digest['day_score'] or 'Not rated'}</span>", unsafe_allow_html=True)
+        if digest['summary']:
+            st.write(digest['summary'])
+        for meal in meals:
+            delta = digest['meal_deltas'].get(meal.id)
+            if delta is None:
+                continue
+            color = 'green' if delta['delta'] > 0 else 'red' if delta['delta'] < 0 else 'gray'
+            st.markdown(f"<span style='color: {color}; font-weight: bold;'>{delta['delta']:+d}</span> "
+                        f"{escape(meal.name)} ({meal.time}): {escape(delta['reason'])}",
+                        unsafe_allow_html=True)
+        if digest['tomorrow']:
+            st.info(f"Tomorrow: {digest['tomorrow']}")
+
 def main():
     st.set_page_config(page_title="Meal Log", page_icon="🍽️", layout="wide")
     st.markdown(css, unsafe_allow_html=True)
     
     st.title("Meal Log")
 
+    # Leaving the upload page makes any running food detection pointless
+    cancel_on_navigation(st.session_state)
+    release_job_images(st.session_state)
+
     # Add Meal button
     col1, col2, col3 = st.columns([2,8,2])
     with col1:
         if st.button("+ Add Meal", use_container_width=True):
             st.switch_page("app.py")
 
+    # Background analyses that haven't been shown yet
+    jobs = pending_jobs(st.session_state)
+    if any(not job.is_finished for job in jobs):
+        pending_analyses_poller()
+    elif jobs:
+        pending_analyses()
+
+    # Export / import meal history
+    with st.expander("Export / Import"):
+        export_format = st.selectbox("Format", list(FORMATS), key="export_format")
+        include_photos = st.checkbox("Include photos", value=True, key="export_photos")
+        if st.button("Prepare Export", key="prepare_export"):
+            extension, mime = FORMATS[export_format]
+            data = export_meal_log_bytes(
+                get_meal_log(st.session_state),
+                fmt=export_format,
+                load_image=lambda image: load_image_bytes(st.session_state, image),
+                include_images=include_photos
+            )
+            st.download_button(
+                "Download Meal History",
+                data=data,
+                file_name=f"meal_log{extension}",
+                mime=mime,
+                key="download_export"
+            )
+
+        history_file = st.file_uploader("Import Meal History", type=["parquet", "arrow"], key="import_history")
+        if history_file and st.button("Import", key="import_meals"):
+            try:
+                meal_log = get_meal_log(st.session_state)
+                imported = 0
+                for meal in iter_imported_meals(history_file):
+                    meal = meal_log.append(meal)
+                    if meal.image:
+                        session_images(st.session_state).hold(f"meal:{meal.id}", [meal.image])
+                    index_meal(st.session_state, meal)
+                    imported += 1
+                enforce_budget(st.session_state)
+                st.success(f"Imported {imported} meals!")
+            except Exception as e:
+                st.error(f"Error importing meal history: {str(e)}")
+
     # Display meal log
-    if 'meal_log' in st.session_state and st.session_state.meal_log:
-        for index, meal in enumerate(reversed(st.session_state.meal_log)):
+    meal_log = get_meal_log(st.session_state)
+    if meal_log:
+        search_index = get_meal_index(st.session_state)
+        query, meal_type, score, date = search_filters(search_index)
+        daily_digest_section(meal_log, search_index.facets()['dates'])
+
+        if query or meal_type or score or date:
+            start = time.perf_counter()
+            meal_ids = search_index.search(query, meal_type=meal_type, score=score, date=date)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            st.caption(f"{len(meal_ids)} meals found in {elapsed_ms:.1f} ms")
+            if len(meal_ids) > MAX_SEARCH_RESULTS:
+                st.caption(f"Showing the {MAX_SEARCH_RESULTS} most recent matches.")
+            meals = [meal_log.get(meal_id) for meal_id in meal_ids[:MAX_SEARCH_RESULTS]]
+        else:
+            meals = list(meal_log.newest_first())
+
+        for meal in meals:
             # Create two-column layout
             col1, col2 = st.columns([7, 3])
             
@@ -263,9 +435,15 @@ def main():
             
             with col2:
                 try:
-                    if isinstance(meal['image'], bytes):
-                        image = Image.open(io.BytesIO(meal['image']))
-                        st.image(image, use_column_width=True)
+                    # Imported or spilled images move to the image store once, after that only the URL is sent
+                    stored = ensure_stored(
+                        meal.image,
+                        lambda image: load_image_bytes(st.session_state, image),
+                        lambda image_bytes: session_images(st.session_state).store(f"meal:{meal.id}", image_bytes)
+                    )
+                    if stored is not None:
+                        meal.image = stored
+                        st.markdown(image_html(stored), unsafe_allow_html=True)
                 except Exception:
                     st.info("No image available")
 
@@ -273,51 +451,52 @@ def main():
             with st.expander(f"Show Details"):
                 # Basic information
                 st.markdown(f"**Food Items:**")
-                st.markdown(meal['details'])
+                st.markdown(meal.details)
                 
                 # Nutritional Analysis
                 st.markdown("### Nutritional Analysis")
-                if 'nutrition_analysis' in meal and 'values' in meal['nutrition_analysis']:
-                    st.components.v1.html(
-                        nutrition_bar_chart(meal['nutrition_analysis']['values']), 
-                        height=180
-                    )
+                st.components.v1.html(
+                    nutrition_bar_chart(meal.nutritional_values), 
+                    height=180
+                )
                 
                 # PCOS Analysis
                 st.markdown("### PCOS Analysis")
-                if 'pcos_analysis' in meal:
-                    # Focus Areas
-                    st.markdown("#### Focus Areas")
-                    st.components.v1.html(
-                        create_focus_area_analysis(meal['pcos_analysis'].get('focus_areas', {})),
-                        height=280
-                    )
-                    
-                    # Suggestions
-                    st.markdown("#### Recommendations")
-                    st.components.v1.html(
-                        create_suggestions_section(meal['pcos_analysis'].get('suggestions', {})),
-                        height=300
-                    )
+                # Focus Areas
+                st.markdown("#### Focus Areas")
+                st.components.v1.html(
+                    create_focus_area_analysis(meal.focus_areas),
+                    height=280
+                )
+                
+                # Suggestions
+                st.markdown("#### Recommendations")
+                st.components.v1.html(
+                    create_suggestions_section(meal.suggestions),
+                    height=300
+                )
 
                 # Edit and Delete buttons
                 col3, col4 = st.columns([1, 1])
                 with col3:
-                    if st.button("✏️ Edit", key=f"edit_meal_{index}"):
-                        st.session_state.editing_meal = len(st.session_state.meal_log) - 1 - index
-                        st.experimental_rerun()
+                    if st.button("✏️ Edit", key=f"edit_meal_{meal.id}"):
+                        st.session_state.editing_meal = meal.id
+                        st.rerun()
                 with col4:
-                    if st.button("🗑️ Delete", key=f"delete_meal_{index}"):
-                        if st.warning("Are you sure you want to delete this meal?",
-                                  key=f"warning_{index}"):
-                            st.session_state.meal_log.pop(len(st.session_state.meal_log) - 1 - index)
-                            st.success("Meal deleted!")
-                            st.experimental_rerun()
+                    if st.button("🗑️ Delete", key=f"delete_meal_{meal.id}"):
+                        meal_log.remove(meal.id)
+                        search_index.remove(meal.id)
+                        # The photo file goes too unless another meal or session still shows it
+                        session_images(st.session_state).release(f"meal:{meal.id}")
+                        st.success("Meal deleted!")
+                        st.rerun()
 
         # Editing functionality
-        if 'editing_meal' in st.session_state:
-            meal_index = st.session_state.editing_meal
-            meal = st.session_state.meal_log[meal_index]
+        editing = meal_log.get(st.session_state.get('editing_meal'))
+        if editing is None:
+            st.session_state.pop('editing_meal', None)
+        else:
+            meal = editing
             
             st.markdown("---")
             with st.container():
@@ -326,7 +505,7 @@ def main():
                 # Edit form
                 new_details = st.text_area(
                     "Meal Description", 
-                    meal.get('details', ''), 
+                    meal.details, 
                     height=100,
                     key="edit_details"
                 )
@@ -335,7 +514,7 @@ def main():
                 with col1:
                     new_time = st.text_input(
                         "Time", 
-                        meal.get('time', ''),
+                        meal.time,
                         key="edit_time"
                     )
                 
@@ -343,15 +522,37 @@ def main():
                 col3, col4 = st.columns([1,1])
                 with col3:
                     if st.button("💾 Save Changes", key="save_edit"):
-                        meal['details'] = new_details
-                        meal['time'] = new_time
+                        meal.details = new_details
+                        meal.time = new_time
+                        search_index.update(meal)
                         del st.session_state.editing_meal
                         st.success("Changes saved!")
-                        st.experimental_rerun()
+                        st.rerun()
                 with col4:
                     if st.button("❌ Cancel", key="cancel_edit"):
                         del st.session_state.editing_meal
-                        st.experimental_rerun()
+                        st.rerun()
+
+        # Session memory usage and cancelled work
+        with st.expander("Session Stats"):
+            stats = memory_stats(st.session_state)
+            st.write(f"In memory: {stats['in_memory_bytes'] / 1024:.0f} KB "
+                     f"of {stats['budget_bytes'] / 1024:.0f} KB budget")
+            st.write(f"Spilled to disk: {stats['spilled_images']} images "
+                     f"({stats['spilled_bytes'] / 1024:.0f} KB), reloaded {stats['reloads']} times")
+            cancellations = cancellation_registry.stats()
+            st.write(f"In-flight analyses: {cancellations['in_flight']}")
+            for kind, count in cancellations['cancelled'].items():
+                st.write(f"Cancelled {kind}: {count}")
+            model_calls = admission_stats()
+            st.write(f"Model calls: {model_calls['in_flight']} of {model_calls['max_concurrent']} slots in use, "
+                     f"{sum(model_calls['queued'].values())} waiting")
+            speculation = speculation_stats()
+            if speculation['started']:
+                hit_rate = speculation['hit_rate']
+                st.write(f"Speculative analyses: {speculation['started']} started, "
+                         f"{speculation['hits']} used, {speculation['discarded']} discarded"
+                         + (f" ({hit_rate:.0%} hit rate)" if hit_rate is not None else ""))
 
     else:
         st.info("🍽️ No meals logged yet. Add your first meal!")
@@ -360,4 +561,5 @@ def main():
     navigation()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_rerun(st.session_state, st.query_params, "meal_log"):
+        main()
\ No newline at end of file
@@ -0,0 +1,246 @@
+import os
+import re
+
+from item_cache import item_cache, parse_food_items, unparsed_lines
+from meal_records import FOCUS_AREAS, NUTRIENTS
+
+# "local" scores meals with the rule tables below, "model" asks Gemini for everything as before
+PCOS_SCORING = os.getenv("PCOS_SCORING", "local")
+
+HORMONAL, INFLAMMATION, ENERGY, REPRODUCTIVE = FOCUS_AREAS
+
+BASE_SCORE = 3
+
+# Glycemic index by whole words of the normalized item name, first match wins
+GLYCEMIC_INDEX = [
+    ('white rice', 73), ('brown rice', 68), ('rice', 70),
+    ('white bread', 75), ('whole wheat', 69), ('sourdough', 54), ('bread', 70), ('toast', 70), ('bagel', 72),
+    ('oatmeal', 55), ('oats', 55), ('porridge', 55), ('quinoa', 53), ('pasta', 49), ('noodle', 47),
+    ('sweet potato', 63), ('potato', 78), ('fries', 75), ('corn', 52),
+    ('cake', 70), ('cookie', 70), ('donut', 76), ('muffin', 65), ('pastry', 70), ('ice cream', 51),
+    ('soda', 63), ('juice', 50), ('honey', 61), ('sugar', 65), ('syrup', 68), ('chocolate', 40),
+    ('banana', 51), ('mango', 51), ('apple', 36), ('blueberry', 40), ('strawberry', 40), ('raspberry', 40), ('berry', 40), ('orange', 43), ('fruit', 45),
+    ('lentil', 32), ('bean', 30), ('chickpea', 28), ('hummus', 25),
+    ('yogurt', 35), ('milk', 37),
+]
+# Carbohydrate source whose kind isn't in the table
+DEFAULT_GLYCEMIC_INDEX = 55
+
+# Food groups by whole words of the normalized item name (plurals match too), used by the rules below
+FOOD_GROUPS = {
+    'sugary': ['cake', 'cookie', 'donut', 'muffin', 'pastry', 'ice cream', 'candy', 'soda', 'syrup', 'sugar', 'chocolate', 'juice'],
+    'refined_grain': ['white rice', 'white bread', 'bagel', 'fries', 'pasta', 'noodle', 'croissant', 'pizza'],
+    'whole_grain': ['whole wheat', 'whole grain', 'brown rice', 'oats', 'oatmeal', 'quinoa', 'barley', 'sourdough', 'buckwheat'],
+    'legume': ['lentil', 'bean', 'chickpea', 'hummus', 'tofu', 'edamame', 'pea'],
+    'vegetable': ['spinach', 'kale', 'broccoli', 'salad', 'lettuce', 'vegetable', 'tomato', 'pepper', 'carrot', 'cucumber', 'zucchini', 'cauliflower', 'asparagus', 'cabbage'],
+    'leafy_green': ['spinach', 'kale', 'lettuce', 'arugula', 'chard', 'salad'],
+    'omega3': ['salmon', 'sardine', 'mackerel', 'tuna', 'walnut', 'chia', 'flax', 'trout'],
+    'healthy_fat': ['avocado', 'olive', 'nut', 'almond', 'cashew', 'walnut', 'seed', 'peanut butter', 'almond butter'],
+    'fried': ['fried', 'fries', 'chips', 'tempura', 'nugget'],
+    'processed_meat': ['bacon', 'sausage', 'ham', 'salami', 'hot dog', 'pepperoni'],
+    'meat': ['chicken', 'beef', 'pork', 'lamb', 'bacon', 'sausage', 'ham', 'salami', 'turkey', 'steak', 'fish', 'salmon', 'tuna', 'shrimp'],
+    'pork': ['pork', 'bacon', 'ham', 'salami', 'pepperoni'],
+    'dairy': ['milk', 'cheese', 'yogurt', 'cream', 'butter'],
+    'gluten': ['bread', 'toast', 'pasta', 'noodle', 'bagel', 'wheat', 'pizza', 'cake', 'cookie', 'muffin', 'pastry', 'croissant', 'cracker'],
+}
+
+# Phrases that take an item out of a group altogether, e.g. "gluten-free bread"
+GROUP_NEGATIONS = {
+    'sugary': ['sugar free', 'no sugar', 'unsweetened', 'no added sugar'],
+    'fried': ['not fried', 'air fried', 'oven baked'],
+    'meat': ['meatless', 'meat free', 'plant based', 'vegan', 'vegetarian', 'veggie burger', 'veggie sausage'],
+    'processed_meat': ['plant based', 'vegan', 'vegetarian', 'veggie burger', 'veggie sausage'],
+    'pork': ['plant based', 'vegan', 'vegetarian', 'halal', 'kosher'],
+    'dairy': ['dairy free', 'non dairy', 'lactose free', 'vegan', 'plant based'],
+    'gluten': ['gluten free', 'wheat free'],
+}
+
+# Phrases removed before matching a group: plant milks aren't dairy, nut butters aren't butter
+GROUP_EXCEPTIONS = {
+    'dairy': [
+        'oat milk', 'almond milk', 'soy milk', 'soya milk', 'rice milk', 'coconut milk', 'cashew milk',
+        'hemp milk', 'pea milk', 'plant milk', 'coconut cream', 'coconut yogurt', 'soy yogurt',
+        'peanut butter', 'almond butter', 'cashew butter', 'nut butter', 'seed butter', 'cocoa butter',
+        'apple butter', 'sunflower butter',
+    ],
+    'pork': [
+        'turkey bacon', 'turkey ham', 'turkey salami', 'turkey pepperoni', 'beef bacon', 'beef salami',
+        'beef pepperoni', 'chicken ham',
+    ],
+    'gluten': ['buckwheat'],
+    'healthy_fat': ['coconut'],
+}
+
+
+def _plural(phrase):
+    if phrase.endswith('y') and not phrase.endswith(('ay', 'ey', 'oy')):
+        return re.escape(phrase[:-1]) + '(?:y|ies)'
+    return re.escape(phrase) + '(?:e?s)?'
+
+
+def _phrase_pattern(phrases):
+    """Whole-word match of any phrase, plurals included"""
+    alternatives = '|'.join(_plural(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf'\b(?:{alternatives})\b')
+
+
+GROUP_PATTERNS = {group: _phrase_pattern(keywords) for group, keywords in FOOD_GROUPS.items()}
+NEGATION_PATTERNS = {group: _phrase_pattern(phrases) for group, phrases in GROUP_NEGATIONS.items()}
+EXCEPTION_PATTERNS = {group: _phrase_pattern(phrases) for group, phrases in GROUP_EXCEPTIONS.items()}
+GLYCEMIC_PATTERNS = [(_phrase_pattern([keyword]), index) for keyword, index in GLYCEMIC_INDEX]
+
+
+def _known(condition):
+    """Macro rule condition, never true when the meal's nutrition couldn't be determined"""
+    return lambda m: m['has_nutrition'] and condition(m)
+
+
+# (focus area, condition on the meal metrics, score change, explanation)
+RULES = [
+    (HORMONAL, _known(lambda m: m['glycemic_load'] >= 20), -2, "High glycemic load, expect an insulin spike"),
+    (HORMONAL, _known(lambda m: 10 < m['glycemic_load'] < 20), -1, "Moderate glycemic load"),
+    (HORMONAL, _known(lambda m: m['has_carbs'] and m['glycemic_load'] <= 10), 1, "Low glycemic load keeps insulin steady"),
+    (HORMONAL, _known(lambda m: m['carbs'] >= 60), -1, "Carb-heavy plate"),
+    (HORMONAL, _known(lambda m: m['protein'] >= 25), 1, "Protein slows glucose absorption"),
+    (HORMONAL, _known(lambda m: m['fiber'] >= 10), 1, "Fiber blunts the blood sugar rise"),
+    (HORMONAL, lambda m: m['sugary'], -1, "Added sugar"),
+
+    (INFLAMMATION, _known(lambda m: m['fiber'] >= 10), 1, "Plenty of fiber for gut health"),
+    (INFLAMMATION, _known(lambda m: m['fiber'] < 3), -1, "Little fiber for the gut"),
+    (INFLAMMATION, lambda m: m['omega3'], 1, "Omega-3 rich foods calm inflammation"),
+    (INFLAMMATION, lambda m: m['vegetable'], 1, "Vegetables bring antioxidants"),
+    (INFLAMMATION, lambda m: m['fried'] or m['processed_meat'], -1, "Fried or processed foods are pro-inflammatory"),
+    (INFLAMMATION, lambda m: m['sugary'], -1, "Sugar feeds inflammation"),
+
+    (ENERGY, _known(lambda m: 20 <= m['protein'] <= 40), 1, "Balanced protein for steady energy"),
+    (ENERGY, _known(lambda m: m['glycemic_load'] >= 20), -1, "Expect an energy dip after the sugar spike"),
+    (ENERGY, lambda m: m['whole_grain'] or m['legume'], 1, "Slow carbs for sustained energy"),
+    (ENERGY, lambda m: m['omega3'], 1, "Omega-3s support mood"),
+    (ENERGY, _known(lambda m: m['protein'] < 10), -1, "Too little protein to stay full"),
+
+    (REPRODUCTIVE, lambda m: m['leafy_green'] or m['legume'], 1, "Folate-rich foods"),
+    (REPRODUCTIVE, lambda m: m['omega3'] or m['healthy_fat'], 1, "Healthy fats support hormone production"),
+    (REPRODUCTIVE, lambda m: m['processed_meat'] or m['fried'], -1, "Processed and fried fats"),
+    (REPRODUCTIVE, lambda m: m['sugary'] or (m['has_nutrition'] and m['glycemic_load'] >= 20), -1, "High sugar load affects ovulation"),
+]
+
+# Symptom -> focus areas that weigh more in the overall score
+SYMPTOM_FOCUS = {
+    "Irregular Periods (Menstrual Irregularities)": [REPRODUCTIVE, HORMONAL],
+    "Weight Gain or Difficulty Losing Weight": [HORMONAL],
+    "Acne and Oily Skin": [INFLAMMATION, HORMONAL],
+    "Excess Hair Growth (Hirsutism)": [HORMONAL],
+    "Hair Loss (Alopecia)": [INFLAMMATION],
+    "Fatigue": [ENERGY],
+    "Mood Swings and Anxiety": [ENERGY],
+    "Infertility or Trouble Conceiving": [REPRODUCTIVE],
+}
+
+# Dietary preference -> (condition on the meal metrics, what conflicts with it)
+PREFERENCE_CONFLICTS = {
+    "Vegetarian": (lambda m: m['meat'], "meat or fish"),
+    "Ketogenic (Keto)": (_known(lambda m: m['carbs'] > 15), "too many carbs for keto"),
+    "Gluten-Free": (lambda m: m['gluten'], "gluten"),
+    "Lactose-Free": (lambda m: m['dairy'], "dairy"),
+    "Halal": (lambda m: m['pork'], "pork"),
+    "Kosher": (lambda m: m['pork'], "pork"),
+    "Low-Carb": (_known(lambda m: m['carbs'] > 35), "a high carb share"),
+}
+
+# Weighted mean focus area score -> overall rating
+OVERALL_BANDS = [(3.75, "Promising"), (2.75, "Can Do Better"), (0, "Needs Improvement")]
+
+
+def in_group(name, group):
+    """Whether a normalized item name belongs to a food group"""
+    negation = NEGATION_PATTERNS.get(group)
+    if negation is not None and negation.search(name):
+        return False
+    exception = EXCEPTION_PATTERNS.get(group)
+    if exception is not None:
+        name = exception.sub(' ', name)
+    return bool(GROUP_PATTERNS[group].search(name))
+
+
+def glycemic_index(name):
+    for pattern, index in GLYCEMIC_PATTERNS:
+        if pattern.search(name):
+            return index
+    return DEFAULT_GLYCEMIC_INDEX
+
+
+def glycemic_load(items):
+    """Meal glycemic load from cached per-item carbs, None when an item's carbs aren't known"""
+    load = 0.0
+    for item in items:
+        values = item_cache.get(item.name)
+        if values is None:
+            return None
+        carbs_grams = values['carbs'] * item.grams / 100
+        # Fiber isn't digested, only the rest of the carbs raise blood sugar
+        available = max(0.0, carbs_grams - values['fiber'] * item.grams / 100)
+        load += glycemic_index(item.name) * available / 100
+    return load
+
+
+def meal_metrics(food_items, nutritional_values):
+    """Everything the rules look at, from the item list and the macro shares"""
+    items = parse_food_items(food_items)
+    names = [item.name for item in items]
+    metrics = {
+        nutrient: float(nutritional_values.get(nutrient) or 0)
+        for nutrient in NUTRIENTS
+    }
+    for group in FOOD_GROUPS:
+        metrics[group] = any(in_group(name, group) for name in names)
+
+    load = glycemic_load(items) if items and not unparsed_lines(food_items) else None
+    if load is None:
+        # Rough stand-in when per-item carbs aren't cached or some lines didn't parse: about 70 g of macros at an average GI
+        load = metrics['carbs'] * 0.7 * DEFAULT_GLYCEMIC_INDEX / 100
+    metrics['glycemic_load'] = load
+    metrics['has_carbs'] = metrics['carbs'] > 0
+    # All zeros means the nutrition analysis failed, not a meal without macros
+    metrics['has_nutrition'] = any(metrics[nutrient] for nutrient in NUTRIENTS)
+    return metrics
+
+
+def score_meal(food_items, nutritional_values, symptoms=None, dietary_preference=''):
+    """PCOS score and focus areas in the same shape parse_pcos_response returns, without a model call"""
+    metrics = meal_metrics(food_items, nutritional_values)
+
+    focus_areas = {}
+    for area in FOCUS_AREAS:
+        score = BASE_SCORE
+        reasons = []
+        for rule_area, condition, change, explanation in RULES:
+            if rule_area == area and condition(metrics):
+                score += change
+                reasons.append((abs(change), change, explanation))
+        # Lead with the reasons that moved the score most
+        reasons.sort(key=lambda reason: reason[0], reverse=True)
+        focus_areas[area] = {
+            'score': min(max(score, 1), 5),
+            'explanation': "; ".join(explanation for _, _, explanation in reasons[:2]) or "Neutral for this area",
+        }
+
+    weights = dict.fromkeys(FOCUS_AREAS, 1.0)
+    for symptom in symptoms or []:
+        for area in SYMPTOM_FOCUS.get(symptom, []):
+            weights[area] += 1.0
+    overall = sum(focus_areas[area]['score'] * weights[area] for area in FOCUS_AREAS) / sum(weights.values())
+    pcos_score = next(label for threshold, label in OVERALL_BANDS if overall >= threshold)
+
+    conflicts = []
+    if dietary_preference in PREFERENCE_CONFLICTS:
+        condition, conflict = PREFERENCE_CONFLICTS[dietary_preference]
+        if condition(metrics):
+            conflicts.append(f"contains {conflict}, which doesn't fit a {dietary_preference} diet")
+
+    return {
+        'pcos_score': pcos_score,
+        'focus_areas': focus_areas,
+        'suggestions': {},
+        'preference_conflicts': conflicts,
+        'glycemic_load': round(metrics['glycemic_load'], 1),
+    }
@@ -0,0 +1,95 @@
+import logging
+import threading
+
+from stages import get_stage
+
+logger = logging.getLogger(__name__)
+
+# Rough Gemini accounting: ~4 characters per text token, flat cost per image
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+# Only ask the API for an exact count when the local estimate gets this close to the budget
+EXACT_COUNT_THRESHOLD = 0.8
+
+
+class TokenBudgetExceeded(RuntimeError):
+    pass
+
+
+class UsageTracker:
+    """Process-wide input/output token totals per stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage = {}
+
+    def record(self, stage, input_tokens, output_tokens):
+        with self._lock:
+            usage = self._usage.setdefault(stage, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["output_tokens"] += output_tokens
+
+    def stats(self):
+        with self._lock:
+            return {stage: dict(usage) for stage, usage in self._usage.items()}
+
+
+usage_tracker = UsageTracker()
+
+
+def needs_image(label, food_items=None):
+    """Decide whether a stage has to see the photo again"""
+    if get_stage(label).image == "required":
+        return True
+    # Once the user has confirmed the item list the text carries everything the model needs
+    return not (food_items and food_items.strip())
+
+
+def build_contents(input_text, image, prompt):
+    if image:
+        # A multi-dish meal can come with several photos
+        return [input_text, *image, prompt]
+    return [input_text, prompt]
+
+
+def estimate_tokens(contents):
+    tokens = 0
+    for part in contents:
+        if isinstance(part, str):
+            tokens += len(part) // CHARS_PER_TOKEN + 1
+        else:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+
+def check_input_budget(model, label, contents):
+    """Return the input token count, raising if it exceeds the stage budget"""
+    budget = get_stage(label).max_input_tokens
+    estimate = estimate_tokens(contents)
+    if budget is None or estimate < budget * EXACT_COUNT_THRESHOLD:
+        return estimate
+
+    try:
+        tokens = model.count_tokens(contents).total_tokens
+    except Exception:
+        tokens = estimate
+    if tokens > budget:
+        raise TokenBudgetExceeded(
+            f"{label} request needs {tokens} input tokens, budget is {budget}"
+        )
+    return tokens
+
+
+def record_usage(label, response, estimated_input_tokens):
+    """Log token usage reported by the model, falling back to the local estimate"""
+    stage = get_stage(label).name
+    usage = getattr(response, "usage_metadata", None)
+    input_tokens = getattr(usage, "prompt_token_count", None) or estimated_input_tokens
+    output_tokens = getattr(usage, "candidates_token_count", None) or 0
+    usage_tracker.record(stage, input_tokens, output_tokens)
+    logger.info("%s: %d input tokens, %d output tokens", stage, input_tokens, output_tokens)
+
+
+def usage_stats():
+    return usage_tracker.stats()
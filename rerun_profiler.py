@@ -0,0 +1,118 @@
+"""Profile Streamlit reruns on demand
+
+Open any page with ?profile=1 to profile that session's reruns (?profile=0
+stops), or set PROFILE_RERUNS=1 to profile every session. Each rerun writes
+one file to PROFILE_DIR:
+
+    *.folded  sampled stacks in collapsed format, for flamegraph.pl or speedscope
+    *.prof    cProfile stats with PROFILER=cprofile, for snakeviz or flameprof
+
+Fragment reruns don't go through the page's main() and aren't profiled.
+"""
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from analysis_jobs import session_id
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROFILE_RERUNS = os.getenv("PROFILE_RERUNS", "") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(ROOT, "profiles")
+# "sample" (default) or "cprofile"
+PROFILER = os.getenv("PROFILER", "sample")
+SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+QUERY_PARAM = "profile"
+SESSION_KEY = "_profile_reruns"
+
+
+def profiling_enabled(session_state, query_params):
+    """Whether this session's reruns get profiled, remembering ?profile= across pages"""
+    value = query_params.get(QUERY_PARAM)
+    if value is not None:
+        session_state[SESSION_KEY] = value not in ("0", "false", "off")
+    return session_state.get(SESSION_KEY, PROFILE_RERUNS)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's stack on a timer, so the profiled code runs at full speed"""
+
+    def __init__(self, thread_id, interval_ms=SAMPLE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rerun-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    # Same names as cProfile.Profile so either can be used
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+
+
+def _profile_path(session_state, page, elapsed_ms, ext):
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    name = f"{stamp}-{session_id(session_state)[:8]}-{page}-{elapsed_ms:.0f}ms.{ext}"
+    return os.path.join(PROFILE_DIR, name)
+
+
+@contextmanager
+def profile_rerun(session_state, query_params, page):
+    """Profile the wrapped script run when profiling is on for this session, otherwise do nothing"""
+    if not profiling_enabled(session_state, query_params):
+        yield
+        return
+
+    if PROFILER == "cprofile":
+        profiler = cProfile.Profile()
+    else:
+        profiler = StackSampler(threading.get_ident())
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        # st.rerun() and st.switch_page() end a run by raising, the profile is still saved
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if PROFILER == "cprofile":
+                path = _profile_path(session_state, page, elapsed_ms, "prof")
+                profiler.dump_stats(path)
+            else:
+                path = _profile_path(session_state, page, elapsed_ms, "folded")
+                profiler.write(path)
+            logger.info("Profiled %s rerun in %.0f ms: %s", page, elapsed_ms, path)
+        except OSError as e:
+            logger.warning("Could not save rerun profile: %s", e)
@@ -0,0 +1,147 @@
+import copy
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from item_cache import parse_food_items, unparsed_lines
+
+# Cosine similarity a past meal needs to be a candidate for reuse, above 1 turns reuse off
+THRESHOLD = float(os.getenv("SIMILAR_MEAL_THRESHOLD", "0.8"))
+# Every item needs a counterpart at least this similar, enough for "boiled eggs" vs "hard boiled eggs"
+ITEM_THRESHOLD = float(os.getenv("SIMILAR_MEAL_ITEM_THRESHOLD", "0.75"))
+# Matched items' portion weights may differ by this share and still count as the same meal
+PORTION_TOLERANCE = float(os.getenv("SIMILAR_MEAL_PORTION_TOLERANCE", "0.25"))
+MAX_MEALS = int(os.getenv("SIMILAR_MEAL_CACHE_SIZE", "2000"))
+
+NGRAM = 3
+# Hashed n-gram vector size, collisions are rare at this size for food names
+DIMENSIONS = 1024
+
+
+def _ngram_vector(name):
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    padded = f" {name} "
+    for i in range(len(padded) - NGRAM + 1):
+        # crc32 rather than hash() so vectors don't change between processes
+        vector[zlib.crc32(padded[i:i + NGRAM].encode()) % DIMENSIONS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def meal_vector(food_items):
+    """Unit vector of the normalized item names, each weighted by its share of the portion weight
+
+    Returns (vector, [(item name, grams), ...]), or (None, None) when there are no
+    items or a line didn't parse, since the vector would silently leave it out.
+    """
+    items = parse_food_items(food_items)
+    total_grams = sum(item.grams for item in items)
+    if not items or total_grams <= 0 or unparsed_lines(food_items):
+        return None, None
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for item in items:
+        vector += _ngram_vector(item.name) * (item.grams / total_grams)
+    norm = np.linalg.norm(vector)
+    if not norm:
+        return None, None
+    return vector / norm, [(item.name, item.grams) for item in items]
+
+
+def same_items(items, other):
+    """Whether every item has its own close counterpart with a similar portion, in both meals
+
+    The meal vector alone barely moves when a small item is added, so it is only used to
+    find candidates and the items themselves decide.
+    """
+    if len(items) != len(other):
+        return False
+    names = np.array([_ngram_vector(name) for name, _ in items])
+    similarities = names @ np.array([_ngram_vector(name) for name, _ in other]).T
+    unmatched = set(range(len(other)))
+    for row, (_, grams) in enumerate(items):
+        for column in np.argsort(similarities[row])[::-1]:
+            if similarities[row, column] < ITEM_THRESHOLD:
+                return False
+            other_grams = other[column][1]
+            if column in unmatched and abs(grams - other_grams) <= PORTION_TOLERANCE * max(grams, other_grams):
+                unmatched.discard(column)
+                break
+        else:
+            return False
+    return True
+
+
+def context_key(meal_type, symptoms, dietary_preference):
+    """PCOS results depend on these, so only meals with the same context can share one"""
+    return (meal_type or '', tuple(sorted(symptoms or [])), dietary_preference or '')
+
+
+class SimilarMealIndex:
+    """Past analyses searchable by meal similarity, shared by every session in the process"""
+
+    def __init__(self, max_meals=MAX_MEALS, threshold=THRESHOLD):
+        self.max_meals = max_meals
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # Rows are unit vectors, so a matrix-vector product gives every cosine at once
+        self._vectors = np.zeros((min(max_meals, 64), DIMENSIONS), dtype=np.float32)
+        self._entries = []
+        self._next = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, food_items, meal_type, symptoms=None, dietary_preference=''):
+        """Result of the most similar past meal as (result, similarity), or None below the threshold"""
+        vector, items = meal_vector(food_items)
+        if vector is None:
+            return None
+        context = context_key(meal_type, symptoms, dietary_preference)
+        with self._lock:
+            if self._entries:
+                similarities = self._vectors[:len(self._entries)] @ vector
+                candidates = np.flatnonzero(similarities >= self.threshold)
+                for row in candidates[np.argsort(similarities[candidates])[::-1]]:
+                    similarity = float(similarities[row])
+                    entry_context, entry_items, result = self._entries[row]
+                    if entry_context != context or not same_items(items, entry_items):
+                        continue
+                    self.hits += 1
+                    return copy.deepcopy(result), similarity
+            self.misses += 1
+        return None
+
+    def add(self, food_items, meal_type, symptoms, dietary_preference, result):
+        vector, items = meal_vector(food_items)
+        if vector is None:
+            return
+        entry = (context_key(meal_type, symptoms, dietary_preference), items, copy.deepcopy(result))
+        with self._lock:
+            if len(self._entries) < self.max_meals:
+                row = len(self._entries)
+                if row == len(self._vectors):
+                    grown = np.zeros((min(self.max_meals, row * 2), DIMENSIONS), dtype=np.float32)
+                    grown[:row] = self._vectors
+                    self._vectors = grown
+                self._entries.append(entry)
+            else:
+                # Full, overwrite the oldest row
+                row = self._next
+                self._next = (self._next + 1) % self.max_meals
+                self._entries[row] = entry
+            self._vectors[row] = vector
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+similar_meals = SimilarMealIndex()
+
+
+def stats():
+    return similar_meals.stats()
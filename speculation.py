@@ -0,0 +1,123 @@
+import os
+import threading
+
+from analysis_jobs import get_job_queue, session_id, new_cancel_token, DONE, RUNNING, QUEUED
+from cancellation import registry, DISCARDED
+
+# Start nutrition and PCOS analysis as soon as detection finishes, before the user asks
+SPECULATIVE_ANALYSIS = os.getenv("SPECULATIVE_ANALYSIS", "0") == "1"
+
+SWITCH_KEY = "speculative_analysis"
+JOB_KEY = "speculative_job_id"
+
+
+class SpeculationStats:
+    """Process-wide counts of speculative analyses and how many were used"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.discarded = 0
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self):
+        with self._lock:
+            resolved = self.hits + self.discarded
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "discarded": self.discarded,
+                "hit_rate": self.hits / resolved if resolved else None,
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+def speculation_enabled(session_state):
+    return session_state.get(SWITCH_KEY, SPECULATIVE_ANALYSIS)
+
+
+def speculation_key(food_items, meal_type, symptoms, dietary_preference):
+    """Everything the analysis result depends on besides the photo"""
+    return (
+        (food_items or '').strip(),
+        meal_type,
+        tuple(symptoms or ()),
+        dietary_preference or '',
+    )
+
+
+def start_speculation(session_state, fn, food_items, image_content, meal_type,
+                      symptoms=None, dietary_preference=''):
+    """Submit the analysis for the detected items in the background, once per upload"""
+    if not speculation_enabled(session_state) or session_state.get(JOB_KEY):
+        return None
+    session_state[JOB_KEY] = get_job_queue().submit(
+        session_id(session_state),
+        "speculative",
+        fn,
+        food_items,
+        image_content,
+        meal_type,
+        symptoms=symptoms,
+        dietary_preference=dietary_preference,
+        cancel_token=new_cancel_token(session_state, "speculative"),
+        meta={"speculation_key": speculation_key(food_items, meal_type, symptoms, dietary_preference)},
+        on_expire=_expired
+    )
+    speculation_stats.record("started")
+    return session_state[JOB_KEY]
+
+
+def _expired(job):
+    # Never claimed or dropped, e.g. the user navigated away or the session ended
+    if job.kind == "speculative":
+        speculation_stats.record("discarded")
+
+
+def _discard(session_state, job):
+    registry.cancel(session_id(session_state), DISCARDED, kind="speculative")
+    get_job_queue().discard(job.id)
+    speculation_stats.record("discarded")
+
+
+def drop_speculation(session_state):
+    """Cancel the session's unclaimed speculative analysis, e.g. for a new upload or a meal logged without it"""
+    job_id = session_state.pop(JOB_KEY, None)
+    job = get_job_queue().get(job_id) if job_id else None
+    if job is not None:
+        _discard(session_state, job)
+
+
+def claim_speculation(session_state, food_items, meal_type, symptoms=None,
+                      dietary_preference='', meta=None):
+    """Adopt the speculative job as the real analysis if its inputs still match
+
+    Returns the job id on a hit. On a miss the speculative work is cancelled and
+    None is returned; item nutrition it already fetched stays in the item cache,
+    so unchanged items are still reused by the fresh analysis.
+    """
+    job_id = session_state.pop(JOB_KEY, None)
+    queue = get_job_queue()
+    job = queue.get(job_id) if job_id else None
+    if job is None:
+        return None
+
+    key = speculation_key(food_items, meal_type, symptoms, dietary_preference)
+    if job.status in (QUEUED, RUNNING, DONE) and job.meta.get("speculation_key") == key:
+        job.kind = "analysis"
+        job.meta.update(meta or {})
+        speculation_stats.record("hits")
+        return job.id
+
+    _discard(session_state, job)
+    return None
+
+
+def stats():
+    return speculation_stats.stats()
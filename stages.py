@@ -0,0 +1,77 @@
+import os
+
+
+class Stage:
+    """Model tiers, generation settings, payload rules and input token budget for one pipeline stage"""
+
+    def __init__(self, name, models, max_output_tokens, temperature, latency_slo_ms,
+                 image="required", max_input_tokens=None):
+        # Each setting can be overridden per stage, e.g. DETECTION_MODELS or PCOS_MAX_INPUT_TOKENS
+        prefix = name.upper()
+        self.name = name
+        # Fastest tier last, the router only falls back down this list
+        self.models = os.getenv(f"{prefix}_MODELS", ",".join(models)).split(",")
+        self.max_output_tokens = int(os.getenv(f"{prefix}_MAX_OUTPUT_TOKENS", max_output_tokens))
+        self.temperature = float(os.getenv(f"{prefix}_TEMPERATURE", temperature))
+        self.latency_slo_ms = float(os.getenv(f"{prefix}_LATENCY_SLO_MS", latency_slo_ms))
+        # "required": always attach, "unconfirmed": only until the user confirms the food items
+        self.image = image
+        # None: no budget is enforced
+        budget = os.getenv(f"{prefix}_MAX_INPUT_TOKENS", max_input_tokens)
+        self.max_input_tokens = None if budget is None else int(budget)
+
+    def generation_config(self):
+        return {
+            "max_output_tokens": self.max_output_tokens,
+            "temperature": self.temperature,
+        }
+
+
+TIERS = ["gemini-1.5-flash", "gemini-1.5-flash-8b"]
+
+# Keyed by the label each stage sends as its first content part
+STAGES = {
+    "Food Detection": Stage(
+        "detection", TIERS,
+        max_output_tokens=256, temperature=0.2, latency_slo_ms=6000,
+        image="required", max_input_tokens=2000
+    ),
+    # Four short lines, capped hard so it returns quickly
+    "Nutrition Analysis": Stage(
+        "nutrition", TIERS,
+        max_output_tokens=40, temperature=0.0, latency_slo_ms=3000,
+        image="unconfirmed", max_input_tokens=1500
+    ),
+    # One short line per new food item
+    "Item Nutrition": Stage(
+        "item_nutrition", TIERS,
+        max_output_tokens=256, temperature=0.0, latency_slo_ms=3000,
+        image="unconfirmed", max_input_tokens=1500
+    ),
+    "PCOS Analysis": Stage(
+        "pcos", TIERS,
+        max_output_tokens=512, temperature=0.4, latency_slo_ms=6000,
+        image="unconfirmed", max_input_tokens=2000
+    ),
+    # Three one-line suggestions, the scores are computed locally
+    "PCOS Suggestions": Stage(
+        "pcos_suggestions", TIERS,
+        max_output_tokens=160, temperature=0.4, latency_slo_ms=3000,
+        image="unconfirmed", max_input_tokens=1000
+    ),
+    # A summary plus one line per meal of the day, text only, the meals' photos are never sent
+    "Daily Digest": Stage(
+        "daily_digest", TIERS,
+        max_output_tokens=400, temperature=0.4, latency_slo_ms=6000,
+        image="unconfirmed", max_input_tokens=3000
+    ),
+}
+
+DEFAULT_STAGE = Stage(
+    "default", ["gemini-1.5-flash"],
+    max_output_tokens=1024, temperature=0.7, latency_slo_ms=10000
+)
+
+
+def get_stage(label):
+    return STAGES.get(label, DEFAULT_STAGE)
@@ -0,0 +1,148 @@
+import hashlib
+import math
+import os
+import random
+import time
+
+from stages import get_stage
+
+# Simulated model behaviour: median latency in ms, log-normal spread and failure rate
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+STUB_LATENCY_SIGMA = float(os.getenv("STUB_LATENCY_SIGMA", "0.25"))
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+
+DETECTION_RESPONSE = """• 2 boiled eggs (100g)
+• 1 slice of whole wheat toast (40g)
+• 1/2 avocado (70g)"""
+
+# Detected meals are drawn from this menu per photo, so different photos give different meals
+DETECTION_MENU = [
+    ("boiled eggs", 100), ("slice of whole wheat toast", 40), ("avocado", 70),
+    ("grilled chicken breast", 150), ("brown rice", 180), ("steamed broccoli", 90),
+    ("salmon fillet", 140), ("quinoa salad", 200), ("greek yogurt", 170),
+    ("mixed berries", 80), ("lentil soup", 250), ("white rice", 160),
+    ("beef stir fry", 220), ("sweet potato", 130), ("oatmeal", 240),
+    ("banana", 120), ("tofu scramble", 180), ("whole wheat pasta", 200),
+    ("caesar salad", 190), ("apple", 150),
+]
+
+NUTRITION_RESPONSE = """Protein: 25%
+Fat: 40%
+Carbs: 25%
+Fiber: 10%"""
+
+PCOS_RESPONSE = """PCOS_SCORE: Promising
+
+FOCUS_AREAS:
+Hormonal Balance & Insulin Sensitivity|4|Protein and healthy fats keep blood sugar steady
+Inflammation Control & Gut Health|3|Some fiber, could use more vegetables
+Energy & Mental Health|4|Balanced macros for sustained energy
+Reproductive Health & Fertility|4|Good source of folate and healthy fats
+
+SUGGESTIONS:
+Quick Fix: Add a handful of spinach
+Swap Out: Use sourdough instead of white bread
+Pro Moves: Sprinkle flaxseeds for omega-3s"""
+
+
+def daily_digest_response(prompt):
+    """A delta line for every 'Meal N' line in the prompt"""
+    meal_count = sum(1 for line in prompt.split("\n") if line.startswith("Meal "))
+    deltas = "\n".join(f"{n}|{(n % 3) - 1:+d}|Canned reason for meal {n}" for n in range(1, meal_count + 1))
+    return (
+        "DAY_SCORE: Can Do Better\n"
+        "SUMMARY: Protein was steady across the day. Fiber ran low in the evening.\n"
+        f"MEAL_DELTAS:\n{deltas}\n"
+        "TOMORROW: Add a side of greens to dinner"
+    )
+
+
+def detection_response(contents):
+    """Two to four menu items seeded by the photo bytes, the fixed meal when there is no photo"""
+    photos = [part["data"] for part in contents if isinstance(part, dict) and part.get("data")]
+    if not photos:
+        return DETECTION_RESPONSE
+    rng = random.Random(hashlib.sha256(b"".join(photos)).digest())
+    items = rng.sample(DETECTION_MENU, rng.randint(2, 4))
+    return "\n".join(f"• {name} ({grams * rng.uniform(0.5, 2):.0f}g)" for name, grams in items)
+
+
+def item_nutrition_response(prompt):
+    """Deterministic per-100g values for every item listed after 'Food Items:'"""
+    items = prompt.split("Food Items:", 1)[-1].strip().split("\n")
+    lines = []
+    for item in items:
+        seed = sum(map(ord, item))
+        lines.append(f"{item}|{seed % 25}|{seed % 17}|{seed % 40}|{seed % 7}")
+    return "\n".join(lines)
+
+
+# Canned reply per stage name, built from the request contents
+STUB_RESPONSES = {
+    "detection": detection_response,
+    "nutrition": lambda contents: NUTRITION_RESPONSE,
+    "item_nutrition": lambda contents: item_nutrition_response(contents[-1]),
+    "pcos": lambda contents: PCOS_RESPONSE,
+    "pcos_suggestions": lambda contents: PCOS_RESPONSE.split("\n\n")[-1],
+    "daily_digest": lambda contents: daily_digest_response(contents[-1]),
+}
+
+
+class StubUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class StubResponse:
+    def __init__(self, text, prompt_token_count=0):
+        self.text = text
+        self.usage_metadata = StubUsage(prompt_token_count, len(text) // 4)
+
+
+class StubTokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+def _count_tokens(contents):
+    return sum(len(part) // 4 + 1 if isinstance(part, str) else 258 for part in contents)
+
+
+def configure(latency_ms=None, latency_sigma=None, error_rate=None):
+    """Change the simulated latency and error distributions for new calls"""
+    global STUB_LATENCY_MS, STUB_LATENCY_SIGMA, STUB_ERROR_RATE
+    if latency_ms is not None:
+        STUB_LATENCY_MS = latency_ms
+    if latency_sigma is not None:
+        STUB_LATENCY_SIGMA = latency_sigma
+    if error_rate is not None:
+        STUB_ERROR_RATE = error_rate
+
+
+def simulated_latency(median_ms, sigma):
+    """Draw a latency in seconds from a log-normal distribution around median_ms"""
+    if median_ms <= 0:
+        return 0.0
+    return random.lognormvariate(math.log(median_ms), sigma) / 1000
+
+
+class StubModel:
+    """Local stand-in for genai.GenerativeModel that answers with canned responses"""
+
+    def __init__(self, model_name, latency_ms=None, **kwargs):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+
+    def generate_content(self, contents, **kwargs):
+        latency_ms = STUB_LATENCY_MS if self.latency_ms is None else self.latency_ms
+        time.sleep(simulated_latency(latency_ms, STUB_LATENCY_SIGMA))
+        if random.random() < STUB_ERROR_RATE:
+            raise RuntimeError("429 Resource has been exhausted (simulated)")
+        label = contents[0] if contents and isinstance(contents[0], str) else ""
+        respond = STUB_RESPONSES.get(get_stage(label).name)
+        return StubResponse(respond(contents) if respond else "", _count_tokens(contents))
+
+    def count_tokens(self, contents):
+        return StubTokenCount(_count_tokens(contents))
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from analysis_jobs import JobQueue, QUEUED
+
+
+def wait_for(queue, job_ids, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not all(queue.get(job_id).is_finished for job_id in job_ids):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def start_blocker(queue, work):
+    blocker = queue.submit("s", "analysis", work, "blocker")
+    while queue.get(blocker).status == QUEUED:
+        time.sleep(0.01)
+    return blocker
+
+
+def test_jobs_start_in_priority_order():
+    queue = JobQueue(max_workers=1)
+    release = threading.Event()
+    started = []
+
+    def work(name, progress=None):
+        started.append(name)
+        if name == "blocker":
+            release.wait()
+
+    blocker = start_blocker(queue, work)
+    queued = [queue.submit("s", "speculative", work, "speculative")]
+    queued.append(queue.submit("s", "analysis", work, "analysis"))
+    queued.append(queue.submit("s", "detection", work, "detection"))
+    assert all(queue.get(job_id).status == QUEUED for job_id in queued)
+    assert queue.wait_estimate(queue.get(queued[0])) > queue.wait_estimate(queue.get(queued[2]))
+    release.set()
+    wait_for(queue, [blocker, *queued])
+    assert started == ["blocker", "detection", "analysis", "speculative"]
+
+
+def test_promoted_job_moves_ahead():
+    queue = JobQueue(max_workers=1)
+    release = threading.Event()
+    started = []
+
+    def work(name, progress=None):
+        started.append(name)
+        if name == "blocker":
+            release.wait()
+
+    blocker = start_blocker(queue, work)
+    first = queue.submit("s", "speculative", work, "other")
+    promoted = queue.submit("s", "speculative", work, "promoted")
+    queue.get(promoted).kind = "analysis"
+    release.set()
+    wait_for(queue, [blocker, first, promoted])
+    assert started == ["blocker", "promoted", "other"]
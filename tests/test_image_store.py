@@ -0,0 +1,71 @@
+import gc
+import os
+
+import pytest
+
+import image_store
+from image_store import SessionImages, sweep_orphans
+
+
+@pytest.fixture(autouse=True)
+def image_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "IMAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(image_store, "_refs", {})
+    return tmp_path
+
+
+def test_release_deletes_unreferenced_file():
+    images = SessionImages()
+    image = images.store("meal:a", b"photo")
+    assert os.path.exists(image.path)
+    images.release("meal:a")
+    assert not os.path.exists(image.path)
+
+
+def test_shared_file_survives_until_last_holder():
+    first, second = SessionImages(), SessionImages()
+    image = first.store("meal:a", b"photo")
+    second.store("meal:b", b"photo")
+    first.release("meal:a")
+    assert os.path.exists(image.path)
+    second.release("meal:b")
+    assert not os.path.exists(image.path)
+
+
+def test_replacing_a_key_releases_the_old_images():
+    images = SessionImages()
+    old = images.store("upload", b"first")
+    new = images.store("upload", b"second")
+    assert not os.path.exists(old.path)
+    assert os.path.exists(new.path)
+
+
+def test_move_and_hold_keep_the_file():
+    images = SessionImages()
+    image = images.store("pending_analysis", b"photo")
+    images.move("pending_analysis", "job:1")
+    images.hold("meal:a", [image])
+    images.release("job:1")
+    assert os.path.exists(image.path)
+    images.prune(lambda key: not key.startswith("meal:"))
+    assert not os.path.exists(image.path)
+
+
+def test_session_end_releases_everything():
+    images = SessionImages()
+    image = images.store("meal:a", b"photo")
+    del images
+    gc.collect()
+    assert not os.path.exists(image.path)
+
+
+def test_sweep_removes_only_old_orphans(image_dir):
+    orphan = image_dir / ("0" * 64 + ".png")
+    orphan.write_bytes(b"left over")
+    os.utime(orphan, (0, 0))
+    images = SessionImages()
+    held = images.store("meal:a", b"photo")
+    os.utime(held.path, (0, 0))
+    assert sweep_orphans() == 1
+    assert not orphan.exists()
+    assert os.path.exists(held.path)
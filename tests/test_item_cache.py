@@ -0,0 +1,29 @@
+from item_cache import parse_food_items, parse_item_nutrition, unparsed_lines
+
+EGGS = "eggs|13|10|1|0"
+TOAST = "toast|9|4|48|4"
+
+
+def test_rows_are_matched_by_name_before_position():
+    items = parse_food_items("- 2 eggs (100g)\n- 1 slice of toast (40g)")
+    values = parse_item_nutrition(f"{TOAST}\n{EGGS}", items)
+    assert values['eggs']['protein'] == 13
+    assert values['toast']['carbs'] == 48
+
+
+def test_reworded_rows_fall_back_to_position():
+    items = parse_food_items("- boiled eggs (100g)\n- toast (40g)")
+    values = parse_item_nutrition(f"hard boiled egg|13|10|1|0\n{TOAST}", items)
+    assert values['boiled eggs']['protein'] == 13
+    assert values['toast']['carbs'] == 48
+
+
+def test_missing_rows_are_left_out():
+    items = parse_food_items("- eggs (100g)\n- toast (40g)\n- avocado (70g)")
+    values = parse_item_nutrition(f"{TOAST}\n{EGGS}", items)
+    assert set(values) == {'eggs', 'toast'}
+
+
+def test_unparsed_lines():
+    assert unparsed_lines("- 米饭 (150g)\n- egg (50g)") == ["米饭 (150g)"]
+    assert unparsed_lines("Breakfast\n- egg (50g)") == []
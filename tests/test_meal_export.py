@@ -0,0 +1,65 @@
+import io
+
+import pytest
+
+import image_store
+from image_store import StoredImage, store_image
+from meal_export import export_meal_log, iter_imported_meals
+from meal_records import MealRecord
+
+
+@pytest.fixture(autouse=True)
+def image_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "IMAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(image_store, "_refs", {})
+    return tmp_path
+
+
+def round_trip(meals, fmt, **kwargs):
+    buffer = io.BytesIO()
+    export_meal_log(meals, buffer, fmt=fmt, load_image=lambda image: image.load(), **kwargs)
+    buffer.seek(0)
+    return list(iter_imported_meals(buffer))
+
+
+def meal_with_photo(image):
+    return MealRecord(meal_type="Lunch", name="Salad", details="- greens (100g)",
+                      date="2026-10-19", time="12:30", image=image)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_embedded_photos_round_trip(fmt):
+    image = store_image(b"photo")
+    [meal] = round_trip([meal_with_photo(image)], fmt, include_images=True)
+    assert meal.image == b"photo"
+
+
+def test_photo_references_resolve_against_the_image_store():
+    image = store_image(b"photo")
+    [meal] = round_trip([meal_with_photo(image)], "parquet")
+    assert isinstance(meal.image, StoredImage)
+    assert meal.image.load() == b"photo"
+
+
+def test_missing_photos_import_without_an_image(image_dir):
+    image = store_image(b"photo")
+    buffer = io.BytesIO()
+    export_meal_log([meal_with_photo(image)], buffer, load_image=lambda image: image.load())
+    (image_dir / image.filename).unlink()
+    buffer.seek(0)
+    [meal] = iter_imported_meals(buffer)
+    assert meal.image is None
+
+
+def test_out_of_range_focus_scores_are_clamped():
+    meal = MealRecord(meal_type="Lunch", date="2026-10-19", pcos_analysis={'focus_areas': {
+        'Hormonal Balance & Insulin Sensitivity': {'score': 200, 'explanation': 'too high'},
+        'Energy & Mental Health': {'score': -3, 'explanation': 'too low'},
+        'Reproductive Health & Fertility': {'score': 0, 'explanation': 'not scored'},
+    }})
+    buffer = io.BytesIO()
+    export_meal_log([meal], buffer)
+    buffer.seek(0)
+    [imported] = iter_imported_meals(buffer)
+    scores = {area: value['score'] for area, value in imported.focus_areas.items()}
+    assert scores == {'Hormonal Balance & Insulin Sensitivity': 5, 'Energy & Mental Health': 1}
@@ -0,0 +1,90 @@
+import pytest
+
+from item_cache import normalize_item_name
+from pcos_rules import in_group, glycemic_index, score_meal
+
+BALANCED = {'protein': 30, 'fat': 25, 'carbs': 35, 'fiber': 10}
+
+
+def conflicts(food_items, dietary_preference):
+    return score_meal(food_items, BALANCED, [], dietary_preference)['preference_conflicts']
+
+
+@pytest.mark.parametrize("item, group", [
+    ("oat milk (200ml)", 'dairy'),
+    ("almond milk latte", 'dairy'),
+    ("peanut butter (30g)", 'dairy'),
+    ("butternut squash soup", 'dairy'),
+    ("dairy-free cheese", 'dairy'),
+    ("chamomile tea", 'pork'),
+    ("graham crackers", 'pork'),
+    ("turkey bacon", 'pork'),
+    ("gluten-free bread (2 slices)", 'gluten'),
+    ("buckwheat pancakes", 'gluten'),
+    ("donuts", 'healthy_fat'),
+    ("chickpea curry", 'meat'),
+    ("sugar-free syrup", 'sugary'),
+])
+def test_not_in_group(item, group):
+    assert not in_group(normalize_item_name(item), group)
+
+
+@pytest.mark.parametrize("item, group", [
+    ("whole milk (200ml)", 'dairy'),
+    ("cheddar cheese", 'dairy'),
+    ("2 slices of ham", 'pork'),
+    ("bacon strips", 'pork'),
+    ("turkey bacon", 'processed_meat'),
+    ("white bread", 'gluten'),
+    ("mixed nuts (30g)", 'healthy_fat'),
+    ("walnuts", 'healthy_fat'),
+    ("grilled chicken and veggies", 'meat'),
+    ("green peas", 'legume'),
+    ("candies", 'sugary'),
+])
+def test_in_group(item, group):
+    assert in_group(normalize_item_name(item), group)
+
+
+@pytest.mark.parametrize("food_items, dietary_preference", [
+    ("- oat milk (200ml)\n- peanut butter toast (60g)\n- butternut squash (100g)", "Lactose-Free"),
+    ("- chamomile tea (250ml)\n- graham crackers (30g)", "Halal"),
+    ("- chamomile tea (250ml)\n- graham crackers (30g)", "Kosher"),
+    ("- gluten-free bread (60g)\n- eggs (100g)", "Gluten-Free"),
+    ("- chickpea salad (200g)", "Vegetarian"),
+])
+def test_no_false_preference_conflicts(food_items, dietary_preference):
+    assert conflicts(food_items, dietary_preference) == []
+
+
+@pytest.mark.parametrize("food_items, dietary_preference", [
+    ("- cheese omelette (150g)", "Lactose-Free"),
+    ("- ham sandwich (150g)", "Halal"),
+    ("- white bread (60g)", "Gluten-Free"),
+    ("- grilled salmon (150g)", "Vegetarian"),
+])
+def test_preference_conflicts(food_items, dietary_preference):
+    assert conflicts(food_items, dietary_preference)
+
+
+def test_glycemic_index_matches_whole_words():
+    assert glycemic_index("blueberries") == 40
+    assert glycemic_index("sweet potato") == 63
+    assert glycemic_index("potatoes") == 78
+    # "rice" must not match inside another word
+    assert glycemic_index("licorice") == glycemic_index("unknown food")
+
+
+def test_scores_stay_in_range():
+    result = score_meal("- donuts (200g)\n- soda (500ml)", {'protein': 3, 'fat': 30, 'carbs': 67, 'fiber': 0})
+    assert result['pcos_score'] == "Needs Improvement"
+    assert all(1 <= area['score'] <= 5 for area in result['focus_areas'].values())
+
+
+def test_unknown_nutrition_skips_macro_rules():
+    zeros = dict.fromkeys(BALANCED, 0)
+    result = score_meal("- salmon (150g)\n- quinoa (100g)\n- spinach (50g)", zeros, [], "Ketogenic (Keto)")
+    explanations = " ".join(area['explanation'] for area in result['focus_areas'].values())
+    assert "fiber" not in explanations.lower()
+    assert "protein" not in explanations.lower()
+    assert "Omega-3" in explanations
@@ -0,0 +1,42 @@
+import pytest
+
+from similar_meals import SimilarMealIndex
+
+RESULT = {'nutritional_values': {'protein': 20}, 'pcos_analysis': {'pcos_score': 'Promising'}}
+BREAKFAST = "- 2 boiled eggs (100g)\n- 1 slice of toast (40g)"
+
+
+@pytest.fixture
+def index():
+    index = SimilarMealIndex()
+    index.add(BREAKFAST, "Breakfast", [], '', RESULT)
+    index.add("- oatmeal (200g)", "Breakfast", [], '', RESULT)
+    return index
+
+
+def lookup(index, food_items):
+    return index.lookup(food_items, "Breakfast", [], '')
+
+
+def test_reworded_meal_is_reused(index):
+    assert lookup(index, "- hard boiled eggs (110g)\n- toast (40g)") is not None
+
+
+@pytest.mark.parametrize("food_items", [
+    "- oatmeal (200g)\n- brown sugar (30g)\n- maple syrup (20g)",
+    BREAKFAST + "\n- bacon (40g)",
+    "- 2 boiled eggs (100g)",
+])
+def test_added_or_removed_items_are_not_reused(index, food_items):
+    assert lookup(index, food_items) is None
+
+
+def test_changed_portion_is_not_reused(index):
+    assert lookup(index, "- 2 boiled eggs (100g)\n- 3 slices of toast (120g)") is None
+
+
+def test_unparsed_lines_are_not_reused(index):
+    index.add("- eggs (100g)", "Breakfast", [], '', RESULT)
+    assert lookup(index, "- eggs (100g)\n- 豆腐 (100g)") is None
+    index.add("- eggs (100g)\n- 豆腐 (100g)", "Breakfast", [], '', RESULT)
+    assert len(index) == 3
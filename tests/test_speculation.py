@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+import analysis_jobs
+import speculation
+from speculation import SWITCH_KEY, SpeculationStats, start_speculation, claim_speculation, drop_speculation
+
+
+def analyze(food_items, image_content, meal_type, symptoms=None, dietary_preference='', progress=None):
+    return {'food_items': food_items}
+
+
+@pytest.fixture(autouse=True)
+def stats(monkeypatch):
+    stats = SpeculationStats()
+    monkeypatch.setattr(speculation, "speculation_stats", stats)
+    return stats
+
+
+@pytest.fixture
+def session_state():
+    session_state = {SWITCH_KEY: True, 'current_file_key': 1}
+    start_speculation(session_state, analyze, "- eggs (100g)", None, "Breakfast")
+    return session_state
+
+
+def test_claimed_speculation_is_a_hit(session_state, stats):
+    assert claim_speculation(session_state, "- eggs (100g)", "Breakfast") is not None
+    assert stats.stats()['hits'] == 1
+
+
+def test_edited_items_discard_the_speculation(session_state, stats):
+    assert claim_speculation(session_state, "- eggs (150g)", "Breakfast") is None
+    assert stats.stats()['discarded'] == 1
+
+
+def test_dropped_speculation_is_discarded(session_state, stats):
+    drop_speculation(session_state)
+    drop_speculation(session_state)
+    assert stats.stats() == {'started': 1, 'hits': 0, 'discarded': 1, 'hit_rate': 0.0}
+
+
+def test_unclaimed_speculation_is_discarded_when_it_expires(session_state, stats, monkeypatch):
+    queue = analysis_jobs.get_job_queue()
+    job = queue.get(session_state[speculation.JOB_KEY])
+    while not job.is_finished:
+        time.sleep(0.01)
+    monkeypatch.setattr(analysis_jobs, "JOB_TTL_SECONDS", -1)
+    queue.submit("other", "analysis", lambda progress=None: None)
+    assert queue.get(job.id) is None
+    assert stats.stats()['discarded'] == 1